@@ -0,0 +1,35 @@
+"""add messages keyset pagination index
+
+Revision ID: a3f1c92e7b04
+Revises: 1dc9cdaba1f1
+Create Date: 2026-10-18 09:12:04.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c92e7b04'
+down_revision: Union[str, Sequence[str], None] = '1dc9cdaba1f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_conversation_id_created_at_id',
+        'messages',
+        ['conversation_id', sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_messages_conversation_id_created_at_id', table_name='messages'
+    )
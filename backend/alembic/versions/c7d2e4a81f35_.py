@@ -0,0 +1,98 @@
+"""add conversation inbox columns
+
+Revision ID: c7d2e4a81f35
+Revises: a3f1c92e7b04
+Create Date: 2026-10-18 17:02:41.306118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e4a81f35'
+down_revision: Union[str, Sequence[str], None] = 'a3f1c92e7b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'conversations',
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        'conversations',
+        sa.Column(
+            'last_message_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        'conversations',
+        sa.Column('user_a_last_read_id', sa.Integer(), nullable=True),
+    )
+    op.add_column(
+        'conversations',
+        sa.Column('user_b_last_read_id', sa.Integer(), nullable=True),
+    )
+
+    # Backfill from the newest message of each conversation; existing
+    # messages count as read so the inbox doesn't start out all unread.
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET last_message_id = m.id,
+            last_message_at = m.created_at,
+            user_a_last_read_id = m.id,
+            user_b_last_read_id = m.id
+        FROM (
+            SELECT DISTINCT ON (conversation_id)
+                conversation_id, id, created_at
+            FROM messages
+            ORDER BY conversation_id, created_at DESC, id DESC
+        ) AS m
+        WHERE m.conversation_id = c.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE conversations
+        SET last_message_at = created_at
+        WHERE last_message_id IS NULL AND created_at IS NOT NULL
+        """
+    )
+
+    op.create_index(
+        'ix_conversations_user_a_id_last_message_at',
+        'conversations',
+        ['user_a_id', 'last_message_at'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_conversations_user_b_id_last_message_at',
+        'conversations',
+        ['user_b_id', 'last_message_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_conversations_user_b_id_last_message_at',
+        table_name='conversations',
+    )
+    op.drop_index(
+        'ix_conversations_user_a_id_last_message_at',
+        table_name='conversations',
+    )
+    op.drop_column('conversations', 'user_b_last_read_id')
+    op.drop_column('conversations', 'user_a_last_read_id')
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'last_message_id')
@@ -0,0 +1,56 @@
+"""add full-text search over messages
+
+Revision ID: e5b81d3c9a42
+Revises: c7d2e4a81f35
+Create Date: 2026-10-18 21:37:15.820944
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b81d3c9a42'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e4a81f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Computing the column rewrites the table, which stays locked meanwhile;
+    # on a large table run this in a maintenance window.
+    op.add_column(
+        'messages',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', text)", persisted=True),
+            nullable=True,
+        ),
+    )
+    # Lets the GIN index lead with the integer conversation_id
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    # Built without blocking writes, outside of the migration's transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_conversation_id_search_vector',
+            'messages',
+            ['conversation_id', 'search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_messages_conversation_id_search_vector',
+        table_name='messages',
+        postgresql_using='gin',
+    )
+    op.drop_column('messages', 'search_vector')
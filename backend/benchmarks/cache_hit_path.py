@@ -0,0 +1,83 @@
+"""Throughput of the cache hit path: re-validated model vs raw bytes.
+
+Serves the same cached body for a list of todos through two in-process
+routes and drives them over ASGI:
+
+- `validated`: what a hit used to do, parsing the cached JSON into
+  `TodoOut` models and letting FastAPI validate and serialize them again
+  through `response_model`;
+- `raw`: what `cache.cached` does now, sending the stored bytes with their
+  ETag in a pre-rendered `Response`.
+
+Run from the backend directory:
+
+    python -m benchmarks.cache_hit_path
+"""
+
+import asyncio
+import time
+from datetime import UTC, date, datetime
+
+import httpx
+from fastapi import FastAPI, Response
+from pydantic import TypeAdapter
+
+from src.todos.dtos import TodoOut
+
+REQUESTS = 2_000
+adapter = TypeAdapter(list[TodoOut])
+
+
+def build_app(size: int) -> FastAPI:
+    body = adapter.dump_json(
+        [
+            TodoOut(
+                id=i,
+                title=f"todo {i}",
+                description="something to do before the due date",
+                due_date=date(2030, 1, 1),
+                created_at=datetime.now(UTC),
+            )
+            for i in range(size)
+        ]
+    )
+    app = FastAPI()
+
+    @app.get("/validated", response_model=list[TodoOut])
+    async def validated() -> list[TodoOut]:
+        return adapter.validate_json(body)
+
+    @app.get("/raw", response_model=list[TodoOut])
+    async def raw() -> Response:
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": '"bench"'},
+        )
+
+    return app
+
+
+async def throughput(client: httpx.AsyncClient, path: str) -> float:
+    """Return requests per second for `REQUESTS` sequential GETs."""
+    await client.get(path)  # warm up
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await client.get(path)
+    return REQUESTS / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    print(f"{'todos':>6}{'validated req/s':>18}{'raw req/s':>12}{'speedup':>9}")
+    for size in (1, 10, 100, 1_000):
+        transport = httpx.ASGITransport(app=build_app(size))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            before = await throughput(client, "/validated")
+            after = await throughput(client, "/raw")
+        print(f"{size:>6}{before:>18.0f}{after:>12.0f}{after / before:>8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Memory use of exporting a large table: streaming vs building a list.
+
+Seeds a scratch database with `--rows` todos (1M by default), then exports
+them twice while sampling the process RSS:
+
+- `stream`: `iter_export`, the server-side cursor behind the export
+  endpoints (e.g. `/todos/export`), discarding each chunk as it is read;
+- `list`: what `list_todos` does, loading every row with
+  `result.scalars().all()` and serializing the whole list at once.
+
+The scratch database is a SQLite file by default; pass `--url` to use an
+empty Postgres database instead (its `todos` table is dropped and recreated).
+Run from the backend directory (Linux only, RSS is read from /proc):
+
+    python -m benchmarks.export_memory [--rows N] [--url URL]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import time
+from datetime import date
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from src.export import ExportFormat, iter_export
+from src.todos.dtos import TodoOut
+from src.todos.models import Todo
+
+SCRATCH = os.path.join(tempfile.gettempdir(), "export_memory.db")
+SEED_BATCH = 10_000
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmRSS not found")
+
+
+async def seed(session: AsyncSession, rows: int) -> None:
+    for start in range(0, rows, SEED_BATCH):
+        await session.execute(
+            insert(Todo.__table__),
+            [
+                {
+                    "title": f"todo {i}",
+                    "description": "exported to measure memory use",
+                    "due_date": date(2030, 1, 1),
+                }
+                for i in range(start, min(start + SEED_BATCH, rows))
+            ],
+        )
+    await session.commit()
+
+
+async def export_stream(session: AsyncSession, fetch_size: int) -> float:
+    """Stream the table and return the highest RSS seen while doing so."""
+    peak = rss_mb()
+    exported = 0
+    chunks = iter_export(
+        session,
+        select(Todo.__table__),
+        TodoOut,
+        ExportFormat.NDJSON,
+        fetch_size,
+    )
+    async for chunk in chunks:
+        exported += chunk.count(b"\n")
+        peak = max(peak, rss_mb())
+    print(f"  streamed {exported} rows")
+    return peak
+
+
+async def export_list(session: AsyncSession) -> float:
+    """Load and serialize the whole table; return the RSS at its peak."""
+    result = await session.execute(select(Todo))
+    todos = result.scalars().all()
+    body = TypeAdapter(list[TodoOut]).dump_json(
+        TypeAdapter(list[TodoOut]).validate_python(todos, from_attributes=True)
+    )
+    peak = rss_mb()
+    print(f"  serialized {len(todos)} rows into {len(body) >> 20} MiB")
+    return peak
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--fetch-size", type=int, default=1000)
+    # never default to the app's database: the todos table is recreated
+    parser.add_argument("--url", default=f"sqlite+aiosqlite:///{SCRATCH}")
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.url)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Todo.__table__.drop, checkfirst=True)
+        await conn.run_sync(Todo.__table__.create)
+
+    start = time.perf_counter()
+    async with sessions() as session:
+        await seed(session, args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    gc.collect()
+    baseline = rss_mb()
+    print(f"baseline RSS: {baseline:.0f} MiB")
+
+    async with sessions() as session:
+        peak = await export_stream(session, args.fetch_size)
+    print(f"stream (fetch_size={args.fetch_size}): peak {peak:.0f} MiB")
+
+    gc.collect()
+    async with sessions() as session:
+        peak = await export_list(session)
+    print(f"list: peak {peak:.0f} MiB")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
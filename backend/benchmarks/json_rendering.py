@@ -0,0 +1,109 @@
+"""Throughput of rendering a list of todos with each JSON response class.
+
+Serves the same todos through four in-process routes with
+`response_model=list[TodoOut]` and drives them over ASGI:
+
+- `default`: no response class, as the app's routes are declared, so
+  FastAPI serializes the validated models with pydantic-core (the baseline
+  the others are compared with);
+- `json`: Starlette's `JSONResponse`, i.e. `json.dumps` of the validated
+  and dumped models;
+- `orjson`: the app's `FastJSONResponse`, rendering the same Python
+  objects with orjson (requires the `orjson` extra; without it this is
+  `json` again);
+- `bytes`: the models serialized by pydantic-core with
+  `TypeAdapter.dump_json` and sent through `FastJSONResponse` as they are.
+
+Run from the backend directory:
+
+    python -m benchmarks.json_rendering
+"""
+
+import asyncio
+import time
+from datetime import UTC, date, datetime
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from src.responses import FastJSONResponse, orjson
+from src.todos.dtos import TodoOut
+
+REQUESTS = 2_000
+adapter = TypeAdapter(list[TodoOut])
+
+
+def build_app(size: int) -> FastAPI:
+    todos = [
+        TodoOut(
+            id=i,
+            title=f"todo {i}",
+            description="something to do before the due date",
+            due_date=date(2030, 1, 1),
+            created_at=datetime.now(UTC),
+        )
+        for i in range(size)
+    ]
+    app = FastAPI()
+
+    @app.get("/default", response_model=list[TodoOut])
+    async def default() -> list[TodoOut]:
+        return todos
+
+    @app.get(
+        "/json", response_model=list[TodoOut], response_class=JSONResponse
+    )
+    async def json() -> list[TodoOut]:
+        return todos
+
+    @app.get(
+        "/orjson",
+        response_model=list[TodoOut],
+        response_class=FastJSONResponse,
+    )
+    async def fast_json() -> list[TodoOut]:
+        return todos
+
+    @app.get("/bytes", response_model=list[TodoOut])
+    async def raw() -> FastJSONResponse:
+        return FastJSONResponse(adapter.dump_json(todos))
+
+    return app
+
+
+async def throughput(client: httpx.AsyncClient, path: str) -> float:
+    """Return requests per second for `REQUESTS` sequential GETs."""
+    await client.get(path)  # warm up
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await client.get(path)
+    return REQUESTS / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    if orjson is None:
+        print("orjson is not installed; `orjson` falls back to json.dumps")
+    # throughput of each route relative to `default`
+    print(
+        f"{'todos':>6}{'default req/s':>15}{'json':>7}{'orjson':>8}"
+        f"{'bytes':>7}"
+    )
+    for size in (1, 10, 100, 1_000):
+        transport = httpx.ASGITransport(app=build_app(size))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            default = await throughput(client, "/default")
+            stdlib = await throughput(client, "/json")
+            fast = await throughput(client, "/orjson")
+            raw = await throughput(client, "/bytes")
+        print(
+            f"{size:>6}{default:>15.0f}{stdlib / default:>6.2f}x"
+            f"{fast / default:>7.2f}x{raw / default:>6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,507 @@
+"""Load test of the HTTP and WebSocket paths, compared with a baseline.
+
+`--clients` concurrent HTTP clients drive each scenario for `--duration`
+seconds while `--listeners` WebSocket clients follow the conversation the
+messages are sent to:
+
+- `list_todos`: `GET /todos` (cached);
+- `inbox`: `GET /users/{id}/conversations` (cached, invalidated by every
+  message of `send_message`);
+- `send_message`: `POST /messages`, whose `message.created` event is fanned
+  out to every listener. Each message carries its send time, so listeners
+  measure the end-to-end delivery latency.
+
+It reports throughput and p50/p95/p99 latencies per scenario.
+
+The app runs in this process against a scratch SQLite database and an
+in-memory Redis (fakeredis) unless `--database-url`/`--redis-url` say
+otherwise (e.g. a throwaway Postgres). It is driven either in-process over
+ASGI (`--transport asgi`, the default; no sockets, so it measures the app
+alone) or over real sockets through uvicorn (`--transport socket`, which
+needs the `websockets` package for listeners). `--url` skips all of that and
+loads an already running server instead.
+
+`--output` writes the results as JSON. `--save-baseline` stores them as the
+baseline, and `--baseline` compares a run with it: regressions larger than
+`--tolerance` are listed and make the exit status 1. Run from the backend
+directory:
+
+    python -m benchmarks.load --save-baseline /tmp/baseline.json
+    python -m benchmarks.load --baseline /tmp/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+
+SCRATCH = os.path.join(tempfile.gettempdir(), "load_benchmark.db")
+TODOS = 50
+# Requests each client sends before a scenario is measured
+WARMUP_REQUESTS = 10
+# Seconds to wait for events still in flight when a scenario ends
+DRAIN_TIMEOUT = 5.0
+
+
+@dataclass
+class Context:
+    """What the scenarios work on, plus the delivery latencies seen."""
+
+    user_a_id: int
+    user_b_id: int
+    conversation_id: int
+    # ms from sending a message to a listener receiving it
+    deliveries: list[float] = field(default_factory=list)
+    sent: int = 0
+
+
+Scenario = Callable[[httpx.AsyncClient, Context], Awaitable[httpx.Response]]
+
+
+async def list_todos(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get("/todos")
+
+
+async def inbox(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get(f"/users/{ctx.user_a_id}/conversations")
+
+
+async def send_message(
+    client: httpx.AsyncClient, ctx: Context
+) -> httpx.Response:
+    ctx.sent += 1
+    return await client.post(
+        "/messages",
+        json={
+            "conversation_id": ctx.conversation_id,
+            "user_id": ctx.user_a_id,
+            "text": f"benchmark {time.perf_counter_ns()}",
+        },
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "list_todos": list_todos,
+    "inbox": inbox,
+    "send_message": send_message,
+}
+
+
+class ASGIWebSocket:
+    """A WebSocket client talking to an ASGI app in this process."""
+
+    def __init__(
+        self, app: Callable[..., Coroutine[object, object, None]], path: str
+    ) -> None:
+        self.app = app
+        path, _, query = path.partition("?")
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self._to_app: asyncio.Queue[dict] = asyncio.Queue()
+        self._from_app: asyncio.Queue[str | bytes | None] = asyncio.Queue()
+        self._accepted = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def connect(self) -> None:
+        await self._to_app.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(
+            self.app(self.scope, self._to_app.get, self._send)
+        )
+        await self._accepted.wait()
+
+    async def _send(self, message: dict) -> None:
+        if message["type"] == "websocket.accept":
+            self._accepted.set()
+        elif message["type"] == "websocket.send":
+            await self._from_app.put(message.get("text") or message["bytes"])
+        elif message["type"] == "websocket.close":
+            self._accepted.set()
+            await self._from_app.put(None)
+
+    async def recv(self) -> str | bytes:
+        frame = await self._from_app.get()
+        if frame is None:
+            raise ConnectionError("WebSocket closed")
+        return frame
+
+    async def close(self) -> None:
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            await self._task
+
+
+async def listen(ws: ASGIWebSocket, ctx: Context) -> None:
+    """Record the delivery latency of every message event received."""
+    while True:
+        try:
+            frame = await ws.recv()
+        except Exception:  # closed, by us or the server
+            return
+        received = time.perf_counter_ns()
+        event = json.loads(frame)
+        if event.get("type") == "message.created":
+            sent = int(event["data"]["text"].removeprefix("benchmark "))
+            ctx.deliveries.append((received - sent) / 1e6)
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """p50/p95/p99, mean and max of `samples` (in ms)."""
+    if not samples:
+        return {}
+    if len(samples) == 1:
+        samples = samples * 2
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+    }
+
+
+async def drain(ctx: Context, listeners: int) -> None:
+    """Let the events of the messages sent so far reach every listener."""
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while (
+        len(ctx.deliveries) < ctx.sent * listeners
+        and time.perf_counter() < deadline
+    ):
+        await asyncio.sleep(0.01)
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: Context,
+    scenario: Scenario,
+    clients: int,
+    duration: float,
+    listeners: int,
+) -> dict[str, object]:
+    latencies: list[float] = []
+    errors = 0
+
+    async def drive(deadline: float) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, ctx)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    for _ in range(WARMUP_REQUESTS):
+        await scenario(client, ctx)
+    await drain(ctx, listeners)
+    ctx.deliveries.clear()
+    ctx.sent = 0
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(drive(deadline) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    await drain(ctx, listeners)
+    expected = ctx.sent * listeners
+
+    result: dict[str, object] = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": summarize(latencies),
+    }
+    if expected:
+        result["deliveries"] = len(ctx.deliveries)
+        result["lost_deliveries"] = expected - len(ctx.deliveries)
+        result["delivery_ms"] = summarize(ctx.deliveries)
+    return result
+
+
+async def seed(client: httpx.AsyncClient) -> Context:
+    """Create the users, conversation and todos the scenarios use."""
+    run = uuid.uuid4().hex[:8]
+    users = []
+    for name in ("a", "b"):
+        response = await client.post(
+            "/users", json={"username": f"bench-{run}-{name}"}
+        )
+        response.raise_for_status()
+        users.append(response.json()["id"])
+    response = await client.post(
+        "/conversations", json={"user_a_id": users[0], "user_b_id": users[1]}
+    )
+    response.raise_for_status()
+    conversation_id = response.json()["id"]
+    for i in range(TODOS):
+        response = await client.post(
+            "/todos",
+            json={
+                "title": f"benchmark todo {i}",
+                "description": "created by benchmarks.load",
+                "due_date": "01.01.2030",
+            },
+        )
+        response.raise_for_status()
+    return Context(
+        user_a_id=users[0],
+        user_b_id=users[1],
+        conversation_id=conversation_id,
+    )
+
+
+def configure_app(args: argparse.Namespace) -> None:
+    """Point the app at the benchmark's database and Redis before import."""
+    if args.database_url is None:
+        if os.path.exists(SCRATCH):
+            os.remove(SCRATCH)
+        args.database_url = f"sqlite+aiosqlite:///{SCRATCH}"
+        os.environ["DB_CREATE_ALL"] = "true"
+    os.environ["ASYNC_SQLALCHEMY_DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_SQLALCHEMY_REPLICA_URLS", None)
+    os.environ["WS_BROADCAST_BACKEND"] = "memory"
+    os.environ["WS_FRAME_FORMAT"] = "text"
+
+    if args.redis_url is not None:
+        os.environ["REDIS_URL"] = args.redis_url
+        return
+    import fakeredis
+    import redis.asyncio
+
+    os.environ["REDIS_URL"] = "redis://fakeredis"
+    server = fakeredis.FakeServer()
+    redis.asyncio.Redis.from_url = classmethod(  # type: ignore[method-assign, assignment]
+        lambda cls, url, **kwargs: fakeredis.FakeAsyncRedis(
+            server=server, **kwargs
+        )
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, object]:
+    app: FastAPI | None = None
+    if args.url is not None:
+        base_url = args.url.rstrip("/")
+    else:
+        configure_app(args)
+        from src.main import app
+
+    async def run(transport: httpx.AsyncBaseTransport | None) -> dict:
+        limits = httpx.Limits(max_connections=args.clients)
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, limits=limits
+        ) as client:
+            ctx = await seed(client)
+            path = f"/ws?topics=conversation:{ctx.conversation_id}"
+            sockets = []
+            for _ in range(args.listeners):
+                if transport is not None:
+                    assert app is not None
+                    ws = ASGIWebSocket(app, path)
+                    await ws.connect()
+                else:
+                    import websockets
+
+                    ws = await websockets.connect(
+                        base_url.replace("http", "ws", 1) + path
+                    )
+                sockets.append(ws)
+            tasks = [asyncio.create_task(listen(ws, ctx)) for ws in sockets]
+
+            results = {}
+            for name in args.scenarios:
+                print(f"running {name}...", file=sys.stderr)
+                results[name] = await run_scenario(
+                    client,
+                    ctx,
+                    SCENARIOS[name],
+                    args.clients,
+                    args.duration,
+                    args.listeners,
+                )
+
+            for ws in sockets:
+                await ws.close()
+            for task in tasks:
+                task.cancel()
+            return results
+
+    if app is None:
+        return await run(None)
+    if args.transport == "asgi":
+        base_url = "http://bench"
+        async with app.router.lifespan_context(app):
+            return await run(httpx.ASGITransport(app=app))
+
+    import uvicorn
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        return await run(None)
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Print both runs side by side and return the regressions found."""
+    if baseline["config"] != results["config"]:
+        print(
+            "warning: the baseline was recorded with a different config: "
+            f"{baseline['config']}"
+        )
+    regressions = []
+    print(
+        f"\n{'scenario':<14}{'metric':<18}{'baseline':>10}{'current':>10}"
+        f"{'change':>9}"
+    )
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        metrics = [
+            (
+                "throughput_rps",
+                before["throughput_rps"],
+                current["throughput_rps"],
+                True,
+            )
+        ]
+        for group in ("latency_ms", "delivery_ms"):
+            for stat in ("p50", "p95", "p99"):
+                if stat in before.get(group, {}) and stat in current.get(
+                    group, {}
+                ):
+                    metrics.append(
+                        (
+                            f"{group.removesuffix('_ms')} {stat} ms",
+                            before[group][stat],
+                            current[group][stat],
+                            False,
+                        )
+                    )
+        for metric, old, new, higher_is_better in metrics:
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{name} {metric}: {change:+.1%}")
+            print(
+                f"{name:<14}{metric:<18}{old:>10.1f}{new:>10.1f}"
+                f"{change:>+9.1%}{flag}"
+            )
+    return regressions
+
+
+def report(results: dict[str, Any]) -> None:
+    print(
+        f"\n{'scenario':<14}{'req/s':>9}{'errors':>8}{'p50 ms':>9}"
+        f"{'p95 ms':>9}{'p99 ms':>9}{'deliv p95':>11}{'lost':>6}"
+    )
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        delivery = result.get("delivery_ms", {})
+        print(
+            f"{name:<14}{result['throughput_rps']:>9.0f}"
+            f"{result['errors']:>8}{latency.get('p50', 0):>9.1f}"
+            f"{latency.get('p95', 0):>9.1f}{latency.get('p99', 0):>9.1f}"
+            f"{delivery.get('p95', 0):>11.1f}"
+            f"{result.get('lost_deliveries', 0):>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--transport", choices=("asgi", "socket"), default="asgi"
+    )
+    parser.add_argument("--url", help="load a running server instead")
+    parser.add_argument("--database-url")
+    parser.add_argument("--redis-url")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--listeners", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with a saved run")
+    parser.add_argument("--save-baseline", help="save this run as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    scenarios = asyncio.run(benchmark(args))
+    results = {
+        "recorded_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "transport": "url" if args.url else args.transport,
+            "database": (args.database_url or "").partition(":")[0],
+            "clients": args.clients,
+            "listeners": args.listeners,
+            "duration": args.duration,
+        },
+        "scenarios": scenarios,
+    }
+    report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nregressions over the tolerance:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
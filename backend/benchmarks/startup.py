@@ -0,0 +1,98 @@
+"""Process startup cost: import time and time to first request.
+
+- `import`: runs `python -X importtime -c "import src.main"` and reports the
+  cumulative import time of the app plus the modules slowest to import;
+- `first request`: starts `uvicorn src.main:app` and polls `GET /` until it
+  answers, i.e. what every worker boot and `--reload` costs.
+
+Both use the current environment (database and Redis URLs), so run it where
+the app itself runs, from the backend directory:
+
+    python -m benchmarks.startup [--runs N]
+"""
+
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def import_time() -> tuple[float, list[tuple[float, str]]]:
+    """Return the ms to import `src.main` and the 10 slowest modules."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    modules: list[tuple[float, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix(
+            "import time:"
+        ).split("|")
+        modules.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == "src.main":
+            total = int(cumulative_us) / 1000
+    return total, sorted(modules, reverse=True)[:10]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request() -> float:
+    """Return the ms from spawning uvicorn until `GET /` succeeds."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/", timeout=1
+                ):
+                    return (time.perf_counter() - start) * 1000
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    print(
+        "import src.main: median "
+        f"{statistics.median(total for total, _ in imports):.0f} ms"
+    )
+    print("slowest modules (self time, last run):")
+    for ms, name in imports[-1][1]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    first = [time_to_first_request() for _ in range(args.runs)]
+    print(
+        f"time to first request: median {statistics.median(first):.0f} ms "
+        f"(min {min(first):.0f}, max {max(first):.0f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Per-event CPU cost of WebSocket fan-out to many connections.
+
+Simulates 1k and 10k subscribed connections and publishes chat messages
+through `WebSocketConnectionManager` in each frame format. The fake sockets
+encode text frames to UTF-8 just like the ASGI server does for every
+`send_text`, so the numbers include the per-recipient encoding cost that
+binary frames avoid.
+
+Run from the backend directory:
+
+    python -m benchmarks.ws_fanout
+"""
+
+import asyncio
+import time
+from datetime import UTC, datetime
+from typing import cast
+
+from fastapi import WebSocket
+
+from src.chat.dtos import MessageOut
+from src.ws import FrameFormat, WebSocketConnectionManager
+
+EVENTS = 20
+
+
+class Deliveries:
+    """Counts frames written to sockets and wakes up once all arrived."""
+
+    def __init__(self, expected: int) -> None:
+        self.expected = expected
+        self.count = 0
+        self.done = asyncio.Event()
+
+    def add(self) -> None:
+        self.count += 1
+        if self.count == self.expected:
+            self.done.set()
+
+
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket connected to a fast client."""
+
+    def __init__(self, deliveries: Deliveries) -> None:
+        self.deliveries = deliveries
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        data.encode()
+        self.deliveries.add()
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.deliveries.add()
+
+
+async def measure(frame_format: FrameFormat, connections: int) -> float:
+    """Return CPU milliseconds spent per event, from publish to delivery."""
+    manager = WebSocketConnectionManager(frame_format=frame_format)
+    await manager.start()
+    deliveries = Deliveries(expected=connections * EVENTS)
+    for _ in range(connections):
+        # only the methods the manager calls are faked
+        websocket = cast(WebSocket, FakeWebSocket(deliveries))
+        await manager.connect(websocket)
+        manager.subscribe(websocket, "conversation:1")
+
+    payload = MessageOut(
+        id=1,
+        conversation_id=1,
+        user_id=1,
+        text="lorem ipsum dolor sit amet " * 8,
+        created_at=datetime.now(UTC),
+    )
+
+    start = time.process_time()
+    for _ in range(EVENTS):
+        await manager.publish_event(
+            "conversation:1", "message.created", payload
+        )
+    await deliveries.done.wait()
+    elapsed = time.process_time() - start
+
+    for websocket in list(manager.active_connections):
+        manager.disconnect(websocket)
+    await manager.stop()
+    return elapsed / EVENTS * 1000
+
+
+async def main() -> None:
+    print(f"{'format':<10}{'connections':>12}{'cpu ms/event':>16}")
+    for connections in (1_000, 10_000):
+        for frame_format in FrameFormat:
+            try:
+                cost = await measure(frame_format, connections)
+            except RuntimeError as exc:  # msgpack not installed
+                print(f"{frame_format:<10}{connections:>12}  skipped: {exc}")
+                continue
+            print(f"{frame_format:<10}{connections:>12}{cost:>16.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
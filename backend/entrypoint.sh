@@ -13,8 +13,16 @@ until PGPASSWORD="$DB_PASSWORD" psql -h "$DB_HOST" -U "$DB_USER" -p "$DB_PORT" -
 done
 >&2 echo "Postgres is up - continuing"
 
+# Run another process from the same image instead (e.g. the job worker);
+# migrations are left to the API container
+if [ "$#" -gt 0 ]; then
+  exec uv run "$@"
+fi
+
 # Apply Alembic migrations
 uv run alembic upgrade head
 
-# Run FastAPI app
-uv run uvicorn src.main:app --host 0.0.0.0 --port 8000 --reload
+# Run FastAPI app; WebSocket clients may negotiate permessage-deflate
+# unless WS_PER_MESSAGE_DEFLATE=false
+uv run uvicorn src.main:app --host 0.0.0.0 --port 8000 --reload \
+  --ws-per-message-deflate "${WS_PER_MESSAGE_DEFLATE:-true}"
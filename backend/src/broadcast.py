@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# An encoded event: `str` is sent as a text frame, `bytes` as a binary frame
+Frame = str | bytes
+
+# Called with the topics and the frame to deliver to local subscribers
+Deliver = Callable[[Sequence[str], Frame], None]
+
+
+class BroadcastBackend(ABC):
+    """Carries published events to every process that holds WebSockets.
+
+    `publish` is called once per event by the process that produced it; the
+    backend then calls `deliver` in each process (including the publishing
+    one) so it can fan the event out to its own local connections.
+    """
+
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None: ...
+
+    @abstractmethod
+    async def stop(self) -> None: ...
+
+    @abstractmethod
+    async def publish(self, topics: Sequence[str], frame: Frame) -> None: ...
+
+
+class InMemoryBroadcastBackend(BroadcastBackend):
+    """Delivers straight to local connections (single process and tests)."""
+
+    def __init__(self) -> None:
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+    async def publish(self, topics: Sequence[str], frame: Frame) -> None:
+        if self._deliver is not None:
+            self._deliver(topics, frame)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """Relays events between workers over a single Redis pub/sub channel.
+
+    Each event is published once as `<kind><topic>,<topic>...\\n<frame>`,
+    where kind is `t` for text and `b` for binary frames, so a client
+    subscribed to several of the event's topics still receives it only once
+    and the frame bytes are relayed without being re-serialized. Topic names
+    never contain commas or newlines.
+    """
+
+    def __init__(self, url: str, channel: str = "ws:events") -> None:
+        self.redis = Redis.from_url(url)
+        self.channel = channel
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.redis.aclose()
+
+    async def publish(self, topics: Sequence[str], frame: Frame) -> None:
+        if isinstance(frame, str):
+            kind, body = b"t", frame.encode()
+        else:
+            kind, body = b"b", frame
+        header = ",".join(topics).encode()
+        await self.redis.publish(self.channel, kind + header + b"\n" + body)
+
+    async def _listen(self, deliver: Deliver) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for event in pubsub.listen():
+                        if event["type"] != "message":
+                            continue
+                        data = event["data"]
+                        header, _, body = data[1:].partition(b"\n")
+                        frame = body.decode() if data[:1] == b"t" else body
+                        deliver(header.decode().split(","), frame)
+            except RedisError:
+                # Keep the worker serving local traffic and retry;
+                # events published while disconnected are lost.
+                logger.exception("WebSocket broadcast listener failed")
+                await asyncio.sleep(1)
+
+
+def create_broadcast_backend() -> BroadcastBackend:
+    """Pick the backend from WS_BROADCAST_BACKEND ("memory" or "redis")."""
+    backend = os.getenv("WS_BROADCAST_BACKEND", "memory")
+    if backend == "memory":
+        return InMemoryBroadcastBackend()
+    if backend == "redis":
+        return RedisBroadcastBackend(os.environ["REDIS_URL"])
+    raise ValueError(f"Unknown WS_BROADCAST_BACKEND: {backend!r}")
@@ -0,0 +1,704 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from itertools import chain
+from typing import Any, cast
+
+from fastapi import APIRouter, Request, Response
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, UOWTransaction
+
+from src.compression import COMPRESSION_MIN_SIZE, Encoding, compress, negotiate
+from src.database import AsyncSessionLocal, post_commit_hooks
+from src.timing import TimedRedis
+
+logger = logging.getLogger(__name__)
+
+Endpoint = Callable[..., Awaitable[Any]]
+
+# Tag versions outlive every entry that may reference them; a version that
+# has expired is simply re-created, which invalidates those entries.
+TAG_VERSION_TTL = 24 * 60 * 60
+
+# Pub/sub channel telling every worker which tags were just invalidated
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class FillDeferred(Exception):
+    """Raised by a cached endpoint whose value is being computed elsewhere.
+
+    The entry is then stored with `ReadThroughCache.put` by whatever
+    computes it, so a background refresh that raises this isn't an error.
+    """
+
+
+def make_etag(key: str, versions: bytes) -> bytes:
+    """Weak ETag of the entry `key` built from the given tag versions.
+
+    It only depends on the versions, so whether a client's copy is current
+    can be told without loading or rendering the entry.
+    """
+    digest = hashlib.blake2b(key.encode() + b"|" + versions, digest_size=16)
+    return f'W/"{digest.hexdigest()}"'.encode()
+
+
+def etag_matches(etag: bytes, if_none_match: str) -> bool:
+    """Weak comparison of `etag` with an If-None-Match header."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag.removeprefix(b"W/").decode() in (
+        tag.removeprefix("W/") for tag in candidates
+    )
+
+
+class _Lookup:
+    """Everything needed to read, load and store one cache entry."""
+
+    def __init__(
+        self,
+        key: str,
+        tags: Sequence[str],
+        load: Callable[..., Awaitable[bytes]],
+        kwargs: dict[str, Any],
+        ttl: int,
+        stale_ttl: int,
+        local_ttl: int,
+        coalesce: bool,
+        stats: Counter[str],
+    ) -> None:
+        self.key = key
+        self.tags = tags
+        self.tag_keys = [f"tagver:{tag}" for tag in tags]
+        self.load = load
+        self.kwargs = kwargs
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.local_ttl = local_ttl
+        self.coalesce = coalesce
+        self.stats = stats
+        # the endpoint reads through a replica session (see `read_session`),
+        # which `_load` swaps for one on the primary
+        self.replica = any(
+            isinstance(value, AsyncSession) and value.info.get("replica")
+            for value in kwargs.values()
+        )
+        # tag versions the loaded value is valid for
+        self.versions = b""
+        # whether the value is fresh and may be kept in the local tier
+        self.fresh = True
+
+
+def _on_session(
+    kwargs: dict[str, Any], session: AsyncSession
+) -> dict[str, Any]:
+    """An endpoint's arguments with its database session replaced."""
+    return {
+        name: session if isinstance(value, AsyncSession) else value
+        for name, value in kwargs.items()
+    }
+
+
+class LocalCache:
+    """Size-bounded, in-process LRU of fresh entries, indexed by tag.
+
+    It sits in front of Redis so hot keys are served without a round trip.
+    Entries live at most a few seconds and are evicted as soon as any worker
+    invalidates one of their tags.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        # key -> (expires_at, body, tags), least recently used first
+        self._entries: OrderedDict[
+            str, tuple[float, bytes, Sequence[str]]
+        ] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        # Bumped on every eviction by tag; a load that started before an
+        # invalidation must not put its (possibly older) result here.
+        self.generation = 0
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, body, _ = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def set(
+        self, key: str, body: bytes, tags: Sequence[str], ttl: float
+    ) -> None:
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, body, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def evict_tags(self, tags: Iterable[str]) -> None:
+        self.generation += 1
+        for tag in tags:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class ReadThroughCache:
+    """Redis read-through cache for GET endpoints.
+
+    Entries are stored as `b"<fresh_until>|<tag versions>|<etag>|<json>"`
+    and kept in Redis for `ttl + stale_ttl` seconds. Within `ttl` they are
+    served as plain hits; after that, and for up to `stale_ttl` more seconds,
+    the stale value is served while a single background task refreshes it.
+
+    The JSON is the final response body: it is rendered once when the entry
+    is loaded and then sent as-is, without being parsed or validated through
+    the response model again.
+
+    Every entry depends on a few tags (e.g. `todos` for the list and
+    `todo:{id}` for one item). Committed writes bump the version of the tags
+    they touch, and an entry whose stored versions no longer match is a miss,
+    so a whole family of keys is invalidated in O(1). Versions are read in the
+    same round trip as the entry.
+
+    The ETag is derived from the key and those versions, so a conditional
+    GET whose `If-None-Match` is still current is answered with a 304 after
+    reading just the versions (or the L1 entry), without touching the
+    database or the cached body.
+
+    Misses are coalesced so that only one load per key runs at a time: in
+    this process through a shared in-flight future, and across processes
+    through a short-lived Redis lock whose losers wait for the winner to
+    fill the entry instead of hitting the database themselves.
+
+    Routes with a `local_ttl` are also kept in a per-process `LocalCache`
+    (L1) in front of Redis (L2). Invalidations are published over Redis
+    pub/sub so every worker evicts the affected L1 entries.
+
+    Entries are always loaded from the primary, even for endpoints that
+    read through a replica session: a replica may predate the write that
+    bumped the tag versions, and its result would then be stored (and
+    ETagged) as current.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        lock_timeout: float = 10.0,
+        local_max_entries: int = 1024,
+    ) -> None:
+        self.redis = redis
+        self.lock_timeout = lock_timeout
+        self.local = LocalCache(local_max_entries)
+        # hit/stale/miss/coalesced counters per cached route
+        self.stats: dict[str, Counter[str]] = {}
+        self._inflight: dict[str, asyncio.Future[bytes]] = {}
+        # background refreshes by key
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._listener: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen_for_invalidations())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def cached(
+        self,
+        key: str,
+        *,
+        tags: Sequence[str],
+        ttl: int,
+        stale_ttl: int = 0,
+        local_ttl: int = 0,
+        coalesce: bool = True,
+        response_model: type[Any],
+    ) -> Callable[[Endpoint], Endpoint]:
+        """Cache an endpoint's response under `key`.
+
+        `key` and `tags` are formatted with the endpoint's arguments, e.g.
+        `"todo:{todo_id}"`, and the result is serialized with
+        `response_model` into a pre-rendered JSON response with an ETag
+        (the route keeps `response_model` for its OpenAPI schema). Requests
+        whose `If-None-Match` still matches get an empty 304. A non-zero
+        `local_ttl` also keeps fresh entries in this process for up to that
+        many seconds. Apply it below the `@router.get` decorator.
+
+        With `coalesce=False`, misses run the endpoint for every request and
+        store nothing: for endpoints whose entries are stored with `put` by
+        work that concurrent requests already share in their own way (e.g.
+        a deduplicated background job), and which may each wait for it
+        differently.
+        """
+        adapter: TypeAdapter[Any] = TypeAdapter(response_model)
+        stats = self.stats.setdefault(key, Counter())
+
+        def decorator(func: Endpoint) -> Endpoint:
+            async def load(**kwargs: object) -> bytes:
+                result = await func(**kwargs)
+                return adapter.dump_json(
+                    adapter.validate_python(result, from_attributes=True)
+                )
+
+            @functools.wraps(func)
+            async def wrapper(_request: Request, **kwargs: object) -> Response:
+                lookup = _Lookup(
+                    key.format(**kwargs),
+                    [tag.format(**kwargs) for tag in tags],
+                    load,
+                    kwargs,
+                    ttl,
+                    stale_ttl,
+                    local_ttl,
+                    coalesce,
+                    stats,
+                )
+                if_none_match = _request.headers.get("if-none-match")
+                if if_none_match:
+                    etag = await self._current_etag(lookup)
+                    if etag and etag_matches(etag, if_none_match):
+                        stats["not_modified"] += 1
+                        return Response(
+                            status_code=304,
+                            headers=self._etag_headers(etag),
+                        )
+
+                etag, _, body = (await self._get(lookup)).partition(b"|")
+                headers = self._etag_headers(etag)
+                if len(body) >= COMPRESSION_MIN_SIZE:
+                    headers["Vary"] = "Accept-Encoding"
+                    encoding = negotiate(
+                        _request.headers.get("accept-encoding")
+                    )
+                    if encoding is not None:
+                        body = await self._compressed(lookup, body, encoding)
+                        headers["Content-Encoding"] = encoding
+                return Response(
+                    content=body,
+                    media_type="application/json",
+                    headers=headers,
+                )
+
+            # let FastAPI inject the request next to the endpoint's own params
+            signature = inspect.signature(func)
+            wrapper.__signature__ = signature.replace(  # type: ignore[attr-defined]
+                parameters=[
+                    *signature.parameters.values(),
+                    inspect.Parameter(
+                        "_request",
+                        inspect.Parameter.KEYWORD_ONLY,
+                        annotation=Request,
+                    ),
+                ]
+            )
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _etag_headers(etag: bytes) -> dict[str, str]:
+        if not etag:
+            # served without knowing the tag versions (Redis is down)
+            return {}
+        # clients may keep the body but must revalidate before using it
+        return {"ETag": etag.decode(), "Cache-Control": "no-cache"}
+
+    async def _current_etag(self, lookup: _Lookup) -> bytes | None:
+        """The ETag a fresh response for `lookup` would carry, if known."""
+        if lookup.local_ttl:
+            value = self.local.get(lookup.key)
+            if value is not None:
+                return value.partition(b"|")[0]
+        try:
+            versions = cast(
+                list[bytes], await self.redis.mget(*lookup.tag_keys)
+            )
+        except RedisError:
+            logger.exception("Cache read failed for %s", lookup.key)
+            return None
+        if None in versions:
+            return None
+        return make_etag(lookup.key, b",".join(versions))
+
+    async def _compressed(
+        self, lookup: _Lookup, body: bytes, encoding: Encoding
+    ) -> bytes:
+        """`body` compressed with `encoding`, compressing each body once.
+
+        The compressed copy is kept next to the entry as
+        `b"<digest of body><compressed body>"` under `<encoding>:<key>`, in
+        Redis and, for routes with a `local_ttl`, in L1. It is only served
+        for the very body it was made from, so it needs no invalidation of
+        its own.
+        """
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        key = f"{encoding}:{lookup.key}"
+        if lookup.local_ttl:
+            value = self.local.get(key)
+            if value is not None and value[:16] == digest:
+                return value[16:]
+        try:
+            value = cast(bytes | None, await self.redis.get(key))
+        except RedisError:
+            logger.exception("Cache read failed for %s", key)
+            return compress(body, encoding)
+
+        if value is not None and value[:16] == digest:
+            compressed = value[16:]
+        else:
+            lookup.stats["compressions"] += 1
+            compressed = compress(body, encoding)
+            value = digest + compressed
+            try:
+                await self.redis.set(
+                    key, value, ex=lookup.ttl + lookup.stale_ttl
+                )
+            except RedisError:
+                logger.exception("Cache write failed for %s", key)
+        if lookup.local_ttl:
+            self.local.set(key, value, lookup.tags, lookup.local_ttl)
+        return compressed
+
+    async def _load(self, lookup: _Lookup) -> bytes:
+        """Run the endpoint and return `<etag>|<json>` for its result."""
+        if lookup.replica:
+            async with AsyncSessionLocal() as session:
+                body = await lookup.load(**_on_session(lookup.kwargs, session))
+        else:
+            body = await lookup.load(**lookup.kwargs)
+        etag = b""
+        if lookup.versions:
+            etag = make_etag(lookup.key, lookup.versions)
+        return etag + b"|" + body
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        """Bump the version of `tags`, invalidating every entry using them."""
+        tags = list(tags)
+        # evict locally right away so this worker reads its own writes
+        self.local.evict_tags(tags)
+        version = str(time.time_ns())
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.set(f"tagver:{tag}", version, ex=TAG_VERSION_TTL)
+            pipe.publish(INVALIDATION_CHANNEL, ",".join(tags))
+            await pipe.execute()
+
+    async def _get(self, lookup: _Lookup) -> bytes:
+        stats = lookup.stats
+        if lookup.local_ttl:
+            body = self.local.get(lookup.key)
+            if body is not None:
+                stats["l1_hits"] += 1
+                return body
+        generation = self.local.generation
+
+        body = await self._get_shared(lookup)
+        if (
+            lookup.local_ttl
+            and lookup.fresh
+            and generation == self.local.generation
+        ):
+            self.local.set(lookup.key, body, lookup.tags, lookup.local_ttl)
+        return body
+
+    async def _get_shared(self, lookup: _Lookup) -> bytes:
+        stats = lookup.stats
+        try:
+            raw: bytes | None
+            raw, *versions = cast(
+                list[bytes], await self.redis.mget(lookup.key, *lookup.tag_keys)
+            )
+            if None in versions:
+                raw = None
+                versions = await self._init_versions(lookup.tag_keys)
+        except RedisError:
+            logger.exception("Cache read failed for %s", lookup.key)
+            stats["errors"] += 1
+            lookup.fresh = False
+            return await self._load(lookup)
+        lookup.versions = b",".join(versions)
+
+        if raw is not None:
+            fresh_until, entry_versions, body = raw.split(b"|", 2)
+            if entry_versions != lookup.versions:
+                stats["invalidated"] += 1
+            elif time.time() < float(fresh_until):
+                stats["l2_hits"] += 1
+                return body
+            else:
+                stats["stale"] += 1
+                lookup.fresh = False
+                self._refresh_in_background(lookup)
+                return body
+
+        stats["misses"] += 1
+        if not lookup.coalesce:
+            return await self._load(lookup)
+        return await self._fill(lookup, wait=True)
+
+    async def _init_versions(self, tag_keys: Sequence[str]) -> list[bytes]:
+        version = str(time.time_ns())
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.set(tag_key, version, ex=TAG_VERSION_TTL, nx=True)
+            pipe.mget(*tag_keys)
+            *_, versions = await pipe.execute()
+        return versions
+
+    async def tag_versions(self, tags: Sequence[str]) -> bytes:
+        """Current versions of `tags`, to `put` an entry computed later."""
+        tag_keys = [f"tagver:{tag}" for tag in tags]
+        versions = cast(list[bytes], await self.redis.mget(*tag_keys))
+        if None in versions:
+            versions = await self._init_versions(tag_keys)
+        return b",".join(versions)
+
+    async def put(
+        self,
+        key: str,
+        versions: bytes,
+        body: bytes,
+        *,
+        ttl: int,
+        stale_ttl: int = 0,
+    ) -> None:
+        """Store `body` as the entry for `key` outside of a request.
+
+        `versions` must be read with `tag_versions` before the data behind
+        `body`, so that a write committed in between leaves the entry
+        already invalidated.
+        """
+        etag = make_etag(key, versions)
+        header = f"{time.time() + ttl}|".encode()
+        entry = header + versions + b"|" + etag + b"|" + body
+        await self.redis.set(key, entry, ex=ttl + stale_ttl)
+
+    async def _fill(self, lookup: _Lookup, wait: bool) -> bytes:
+        """Load and store an entry, letting concurrent callers share it.
+
+        Joins the load already in flight in this process for the same key,
+        if any. With `wait=False` (background refresh) the current entry is
+        returned as-is when another process already holds the lock.
+        """
+        inflight = self._inflight.get(lookup.key)
+        if inflight is not None:
+            lookup.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        # waiters retrieve the exception; don't warn when there are none
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[lookup.key] = future
+        try:
+            body = await self._load_once(lookup, wait)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(body)
+            return body
+        finally:
+            if self._inflight.get(lookup.key) is future:
+                del self._inflight[lookup.key]
+
+    async def _load_once(self, lookup: _Lookup, wait: bool) -> bytes:
+        key = lookup.key
+        lock = self.redis.lock(f"lock:{key}", timeout=self.lock_timeout)
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except RedisError:
+            logger.exception("Cache lock failed for %s", key)
+            return await self._load(lookup)
+
+        if not acquired:
+            if not wait:
+                # another process is already refreshing the entry, which
+                # stays servable in the meantime
+                body = await self._current_body(key, lookup.versions)
+                if body is not None:
+                    return body
+            body = await self._wait_for_fill(key, lookup.versions)
+            if body is not None:
+                return body
+            # the other loader is slow or died, or stored what it read before
+            # a later write; don't wait any longer, nor keep the result in L1
+            lookup.fresh = False
+            return await self._load(lookup)
+
+        try:
+            # Versions were read before loading, so a write that commits
+            # while we load leaves this entry already invalidated.
+            body = await self._load(lookup)
+            header = f"{time.time() + lookup.ttl}|".encode()
+            entry = header + lookup.versions + b"|" + body
+            await self.redis.set(key, entry, ex=lookup.ttl + lookup.stale_ttl)
+            return body
+        finally:
+            try:
+                await lock.release()
+            except RedisError:
+                # the lock expires on its own after lock_timeout
+                pass
+
+    async def _current_body(self, key: str, versions: bytes) -> bytes | None:
+        """The stored body of `key`, unless missing or invalidated since.
+
+        An invalidated entry stays in Redis until it is filled again, so
+        its tag versions must match those read for this lookup.
+        """
+        raw = cast(bytes | None, await self.redis.get(key))
+        if raw is None:
+            return None
+        _, entry_versions, body = raw.split(b"|", 2)
+        return body if entry_versions == versions else None
+
+    async def _wait_for_fill(self, key: str, versions: bytes) -> bytes | None:
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            body = await self._current_body(key, versions)
+            if body is not None:
+                return body
+        return None
+
+    def _refresh_in_background(self, lookup: _Lookup) -> None:
+        if lookup.key in self._inflight or lookup.key in self._refreshing:
+            return
+
+        async def refresh() -> None:
+            # The request's session is closed once the response is sent,
+            # so the refresh gets a session of its own, on the primary.
+            async with AsyncSessionLocal() as session:
+                lookup.kwargs = _on_session(lookup.kwargs, session)
+                lookup.replica = False
+                try:
+                    if lookup.coalesce:
+                        await self._fill(lookup, wait=False)
+                    else:
+                        await self._load(lookup)
+                except FillDeferred:
+                    pass
+                except Exception:
+                    logger.exception("Cache refresh failed for %s", lookup.key)
+
+        task = asyncio.create_task(refresh())
+        self._refreshing[lookup.key] = task
+        task.add_done_callback(
+            lambda _: self._refreshing.pop(lookup.key, None)
+        )
+
+    async def _listen_for_invalidations(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # invalidations may have been missed while disconnected
+                    self.local.clear()
+                    async for event in pubsub.listen():
+                        if event["type"] == "message":
+                            tags = event["data"].decode().split(",")
+                            self.local.evict_tags(tags)
+            except RedisError:
+                logger.exception("Cache invalidation listener failed")
+                self.local.clear()
+                await asyncio.sleep(1)
+
+
+# Its round trips count towards the requests' cache time (`src.timing`)
+redis = TimedRedis.from_url(os.getenv("REDIS_URL"))
+cache = ReadThroughCache(
+    redis, local_max_entries=int(os.getenv("CACHE_L1_MAX_ENTRIES", "1024"))
+)
+
+
+def mark_stale(session: AsyncSession | Session, *tags: str) -> None:
+    """Invalidate `tags` once `session` commits.
+
+    Flushed ORM objects are tracked automatically through their
+    `cache_tags()`; use this for writes issued as plain SQL statements.
+    """
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_cache_tags(
+    session: Session, flush_context: UOWTransaction
+) -> None:
+    for obj in chain(session.new, session.dirty, session.deleted):
+        cache_tags = getattr(obj, "cache_tags", None)
+        if cache_tags is not None:
+            mark_stale(session, *cache_tags())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_tags(session: Session) -> None:
+    session.info.pop("cache_tags", None)
+
+
+async def _invalidate_committed(session: AsyncSession) -> None:
+    tags = session.info.pop("cache_tags", None)
+    if not tags:
+        return
+    try:
+        await cache.invalidate(tags)
+    except RedisError:
+        logger.exception("Cache invalidation failed for %s", tags)
+
+
+post_commit_hooks.append(_invalidate_committed)
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+def cache_stats() -> dict[str, dict[str, int | float]]:
+    """Per-route counters and L1/L2 hit ratios of this worker."""
+    stats: dict[str, dict[str, int | float]] = {}
+    for key, counter in cache.stats.items():
+        l1_hits = counter["l1_hits"]
+        # stale hits are served from Redis too
+        l2_hits = counter["l2_hits"] + counter["stale"]
+        l2_lookups = l2_hits + counter["misses"] + counter["errors"]
+        stats[key] = {
+            **counter,
+            "l1_hit_ratio": l1_hits / max(l1_hits + l2_lookups, 1),
+            "l2_hit_ratio": l2_hits / max(l2_lookups, 1),
+        }
+    return stats
@@ -37,14 +37,16 @@ class MessageOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
-# Model representing a conversation with nested messages.
-# Messages are ordered newest -> oldest.
+# Model representing a conversation with one page of nested messages.
+# Messages are ordered newest -> oldest; `next_cursor` points at the next
+# (older) page and is None once the beginning of the history is reached.
 class ConversationWithMessagesOut(BaseModel):
     id: int
     user_a_id: int
     user_b_id: int
     created_at: datetime
     messages: list[MessageOut]
+    next_cursor: str | None = None
 
     model_config = {"from_attributes": True}
 
@@ -64,3 +66,71 @@ class MessageCreate(BaseModel):
         # normalize text (trim)
         self.text = self.text.strip()
         return self
+
+
+# One message of a bulk import; the conversation comes from the URL
+class MessageBatchItem(BaseModel):
+    user_id: int
+    text: str
+
+    @model_validator(mode="after")
+    def text_must_not_be_empty(self) -> "MessageBatchItem":
+        if not isinstance(self.text, str) or not self.text.strip():
+            raise ValueError("text must be a non-empty string")
+        self.text = self.text.strip()
+        return self
+
+
+# Result of a bulk import, also sent as the `messages.created` event
+class MessageBatchOut(BaseModel):
+    conversation_id: int
+    inserted: int
+
+
+# Start of the last message shown next to a conversation in the inbox
+class MessagePreviewOut(BaseModel):
+    id: int
+    user_id: int
+    text: str
+    created_at: datetime
+
+
+# A conversation as listed in one user's inbox
+class InboxConversationOut(BaseModel):
+    id: int
+    user_a_id: int
+    user_b_id: int
+    created_at: datetime
+    last_message_at: datetime
+    last_message: MessagePreviewOut | None = None
+    unread_count: int
+
+
+# One page of an inbox, most recently active first; `next_cursor` points
+# at the next (less recently active) page
+class InboxOut(BaseModel):
+    conversations: list[InboxConversationOut]
+    next_cursor: str | None = None
+
+
+# Marks everything in a conversation as read by one of its participants
+class ConversationRead(BaseModel):
+    user_id: int
+
+
+# A message matching a search. `snippet` is HTML-escaped text around the
+# matches, which are wrapped in <mark> tags.
+class MessageSearchHit(BaseModel):
+    id: int
+    conversation_id: int
+    user_id: int
+    created_at: datetime
+    snippet: str
+    rank: float
+
+
+# One page of search results, best match first; `next_cursor` points at
+# the next (worse matching) page
+class MessageSearchOut(BaseModel):
+    results: list[MessageSearchHit]
+    next_cursor: str | None = None
@@ -1,5 +1,23 @@
-from sqlalchemy import Column, ForeignKey, Integer, Text, UniqueConstraint
+from datetime import UTC, datetime
+
+from sqlalchemy import (
+    DDL,
+    Column,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+    UniqueConstraint,
+    event,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.functions import FunctionElement
 
 from src.models import Base, BaseModel
 
@@ -15,9 +33,66 @@ class Conversation(Base, BaseModel):
     user_a_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     user_b_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
+    # Denormalized from the messages so the inbox is a single indexed query;
+    # kept up to date by whatever inserts messages. `last_message_at` is the
+    # latest activity: the newest message, or when the conversation started.
+    # (no foreign key: it would be a second path between the two tables)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(
+        DateTime(timezone=True),
+        # set here like `created_at`, see `BaseModel`
+        default=lambda: datetime.now(UTC),
+        server_default=func.now(),
+        nullable=False,
+    )
+    # The newest message each participant has read, for unread counts
+    user_a_last_read_id = Column(Integer, nullable=True)
+    user_b_last_read_id = Column(Integer, nullable=True)
+
     user_a = relationship("src.users.models.User", foreign_keys=[user_a_id])
     user_b = relationship("src.users.models.User", foreign_keys=[user_b_id])
 
+    def cache_tags(self) -> tuple[str, ...]:
+        return (
+            "conversations",
+            f"conversation:{self.id}",
+            # looked up by participants in `get_conversation_by_users`
+            f"conversation:users:{self.user_a_id}:{self.user_b_id}",
+            f"inbox:{self.user_a_id}",
+            f"inbox:{self.user_b_id}",
+        )
+
+
+# Text search configuration of `Message.search_vector`; changing it takes a
+# migration that rebuilds the column and its index
+SEARCH_CONFIG = "english"
+
+
+class SearchVector(FunctionElement):
+    """The text search vector of a text column, as `to_tsvector()` builds it.
+
+    SQLite has no text search, so there (in development databases created
+    with `DB_CREATE_ALL`) the column just holds a copy of the text.
+    """
+
+    type = TSVECTOR()
+    inherit_cache = True
+
+
+@compiles(SearchVector)
+def _compile_search_vector(
+    element: SearchVector, compiler: SQLCompiler, **kw: object
+) -> str:
+    text = compiler.process(element.clauses, **kw)
+    return f"to_tsvector('{SEARCH_CONFIG}', {text})"
+
+
+@compiles(SearchVector, "sqlite")
+def _compile_search_vector_sqlite(
+    element: SearchVector, compiler: SQLCompiler, **kw: object
+) -> str:
+    return compiler.process(element.clauses, **kw)
+
 
 # New Message model: references a single Conversation and a single User
 class Message(Base, BaseModel):
@@ -30,9 +105,65 @@ class Message(Base, BaseModel):
         Integer, ForeignKey("users.id"), nullable=False, index=True
     )
     text = Column(Text, nullable=False)
+    # Maintained by the database and only read by searches; left unmapped
+    # (see `exclude_properties`) so inserts and ORM loads never fetch it
+    search_vector = Column(
+        TSVECTOR().with_variant(Text(), "sqlite"),
+        Computed(SearchVector(text), persisted=True),
+    )
 
     # relationships
     conversation = relationship(
         "src.chat.models.Conversation", backref="messages"
     )
     user = relationship("src.users.models.User")
+
+    __mapper_args__ = {
+        **BaseModel.__mapper_args__,
+        "exclude_properties": ["search_vector"],
+    }
+
+    def cache_tags(self) -> tuple[str, ...]:
+        # not `conversation:{id}`, which stands for the conversation row
+        # itself and is kept by the loaders across messages
+        return (f"conversation:{self.conversation_id}:messages",)
+
+
+# Back the inbox: a user's conversations by latest activity, from either side
+Index(
+    "ix_conversations_user_a_id_last_message_at",
+    Conversation.user_a_id,
+    Conversation.last_message_at,
+)
+Index(
+    "ix_conversations_user_b_id_last_message_at",
+    Conversation.user_b_id,
+    Conversation.last_message_at,
+)
+
+# Full-text search over messages (`websearch_to_tsquery` matches), led by
+# the conversation so that scoped searches only read the entries of the
+# searched conversations. Indexing the integer column in GIN takes the
+# `btree_gin` extension.
+Index(
+    "ix_messages_conversation_id_search_vector",
+    Message.conversation_id,
+    Message.search_vector,
+    postgresql_using="gin",
+)
+event.listen(
+    Message.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gin").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+# Composite index backing keyset pagination of a conversation's history
+# (newest -> oldest, with `id` as the tie-breaker).
+Index(
+    "ix_messages_conversation_id_created_at_id",
+    Message.conversation_id,
+    Message.created_at.desc(),
+    Message.id.desc(),
+)
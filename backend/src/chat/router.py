@@ -1,25 +1,92 @@
+import html
 import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pydantic_core import from_json
+from sqlalchemy import (
+    ColumnElement,
+    Result,
+    Select,
+    Update,
+    case,
+    cast,
+    func,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import REGCONFIG, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from src.cache import cache, mark_stale
 from src.chat.dtos import (
     ConversationOut,
+    ConversationRead,
     ConversationStart,
     ConversationWithMessagesOut,
+    InboxConversationOut,
+    InboxOut,
+    MessageBatchItem,
+    MessageBatchOut,
     MessageCreate,
     MessageOut,
+    MessagePreviewOut,
+    MessageSearchHit,
+    MessageSearchOut,
+)
+from src.chat.models import SEARCH_CONFIG, Conversation, Message
+from src.database import get_async_db, get_read_db, read_session
+from src.export import (
+    DEFAULT_FETCH_SIZE,
+    ExportFormat,
+    ExportFormatQuery,
+    FetchSizeQuery,
+    export_response,
+)
+from src.loaders import Loaders, get_loaders
+from src.pagination import (
+    decode_cursor,
+    decode_rank_cursor,
+    encode_cursor,
+    encode_rank_cursor,
 )
-from src.chat.models import Conversation, Message
-from src.database import get_async_db
 from src.users.models import User
 from src.ws import ws_manager
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Content type of streamed bulk imports: one JSON message per line
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Characters of the last message shown next to each inbox conversation
+PREVIEW_LENGTH = 100
+# Put around matches by `ts_headline`, then turned into <mark> tags once the
+# rest of the snippet is HTML-escaped
+MATCH_START, MATCH_END = "\x02", "\x03"
+HEADLINE_OPTIONS = (
+    f"StartSel={MATCH_START}, StopSel={MATCH_END}, MinWords=8, MaxWords=24, "
+    'MaxFragments=2, FragmentDelimiter=" ... "'
+)
+# Searches rank at most this many matches, the newest ones, so that words
+# found in a large share of the messages don't rank every one of them
+SEARCH_MAX_CANDIDATES = 2_000
+
 
 @router.post("/conversations", response_model=ConversationOut)
 async def start_conversation(
@@ -27,35 +94,42 @@ async def start_conversation(
     response: Response,
     db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> Conversation:
+    """Start a conversation between two users, or return the existing one.
+
+    The insert is an atomic upsert, so concurrent requests for the same pair
+    never fail on `uq_conversation_users`: one gets 201 and the others 200,
+    each with at most two statements.
+    """
     user_a_id, user_b_id = sorted([conv.user_a_id, conv.user_b_id])
 
-    # Verify both users exist
-    result = await db.execute(
-        select(User).where(User.id.in_([user_a_id, user_b_id]))
-    )
-    users = result.scalars().all()
-    if len(users) != 2:
+    try:
+        db_conv = await db.scalar(
+            insert(Conversation)
+            .values(user_a_id=user_a_id, user_b_id=user_b_id)
+            .on_conflict_do_nothing(index_elements=["user_a_id", "user_b_id"])
+            .returning(Conversation)
+        )
+    except IntegrityError:
+        # the foreign keys reject users that don't exist
+        await db.rollback()
         raise HTTPException(
             status_code=404, detail="One or both users not found"
-        )
+        ) from None
 
-    # Check if conversation already exists
-    result = await db.execute(
-        select(Conversation).where(
-            Conversation.user_a_id == user_a_id,
-            Conversation.user_b_id == user_b_id,
-        )
-    )
-    existing = result.scalar_one_or_none()
-    if existing:
+    if db_conv is None:
         # Return 200 when conversation already exists
+        result = await db.execute(
+            select(Conversation).where(
+                Conversation.user_a_id == user_a_id,
+                Conversation.user_b_id == user_b_id,
+            )
+        )
         response.status_code = status.HTTP_200_OK
-        return existing
+        return result.scalar_one()
 
-    db_conv = Conversation(user_a_id=user_a_id, user_b_id=user_b_id)
-    db.add(db_conv)
+    # plain INSERT statements are not seen by the flush-time tag tracking
+    mark_stale(db, *db_conv.cache_tags())
     await db.commit()
-    await db.refresh(db_conv)
 
     # Return 201 when newly created
     response.status_code = status.HTTP_201_CREATED
@@ -66,56 +140,323 @@ async def start_conversation(
     "/messages", response_model=MessageOut, status_code=status.HTTP_201_CREATED
 )
 async def send_message(
-    msg: MessageCreate, db: Annotated[AsyncSession, Depends(get_async_db)]
+    msg: MessageCreate,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    loaders: Annotated[Loaders, Depends(get_loaders)],
 ) -> Message:
     """Create a new message in a conversation.
 
     Validates that the conversation exists, the user exists,
     and the user is a participant in the conversation.
     Returns the created Message (201).
+
+    Participants always exist, so on the happy path only the conversation
+    is loaded (usually from the loaders' shared cache), and the insert
+    returns the generated columns: one INSERT, the UPDATE of the
+    conversation's last message and the COMMIT.
     """
-    # Verify conversation exists
-    result = await db.execute(
-        select(Conversation).where(Conversation.id == msg.conversation_id)
-    )
-    conv = result.scalar_one_or_none()
+    conv = await loaders.conversations.load(msg.conversation_id)
     if conv is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Verify user exists
-    result = await db.execute(select(User).where(User.id == msg.user_id))
-    user = result.scalar_one_or_none()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Verify user is a participant of the conversation
-    if msg.user_id not in (conv.user_a_id, conv.user_b_id):
-        raise HTTPException(
-            status_code=403,
-            detail="User is not a participant in the conversation",
-        )
+    await _check_participant(loaders, conv, msg.user_id)
 
     db_msg = Message(
         conversation_id=msg.conversation_id, user_id=msg.user_id, text=msg.text
     )
     db.add(db_msg)
+    await db.flush()
+    message = MessageOut.model_validate(db_msg)
+    await db.execute(
+        _record_last_message(
+            conv, message.id, message.user_id, message.created_at
+        )
+    )
+    # the message only knows its conversation's id; cached pages looked up
+    # by participants are tagged with the pair
+    mark_stale(
+        db,
+        f"conversation:users:{conv.user_a_id}:{conv.user_b_id}",
+        f"inbox:{conv.user_a_id}",
+        f"inbox:{conv.user_b_id}",
+    )
     await db.commit()
-    await db.refresh(db_msg)
 
-    # Broadcast the new message to any connected websocket clients
-    # so frontends can update in real time.
+    # Publish the new message to clients following this conversation or
+    # either participant so frontends can update in real time.
     try:
-        message_out = MessageOut.model_validate(db_msg)
-        await ws_manager.broadcast(message_out.model_dump_json())
+        await ws_manager.publish_event(
+            (
+                f"conversation:{conv.id}",
+                f"user:{conv.user_a_id}",
+                f"user:{conv.user_b_id}",
+            ),
+            "message.created",
+            message,
+        )
     except Exception as exc:  # log the exception instead of silently passing
         logger.exception("Failed to broadcast message: %s", exc)
 
     return db_msg
 
 
+async def _check_participant(
+    loaders: Loaders, conv: ConversationOut, user_id: int
+) -> None:
+    """Raise 404/403 unless `user_id` takes part in `conv`."""
+    if user_id in (conv.user_a_id, conv.user_b_id):
+        return
+    if await loaders.users.load(user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    raise HTTPException(
+        status_code=403,
+        detail="User is not a participant in the conversation",
+    )
+
+
+def _last_read_column(conv: ConversationOut, user_id: int) -> str:
+    if user_id == conv.user_a_id:
+        return "user_a_last_read_id"
+    return "user_b_last_read_id"
+
+
+def _record_last_message(
+    conv: ConversationOut,
+    message_id: int,
+    sender_id: int,
+    created_at: datetime,
+) -> Update:
+    """Point `conv` at its newest message, which its sender has read.
+
+    The guard keeps a slower, concurrent writer of an older message from
+    moving the pointer back.
+    """
+    return (
+        update(Conversation)
+        .where(
+            Conversation.id == conv.id,
+            func.coalesce(Conversation.last_message_id, 0) < message_id,
+        )
+        .values(
+            {
+                "last_message_id": message_id,
+                "last_message_at": created_at,
+                _last_read_column(conv, sender_id): message_id,
+            }
+        )
+    )
+
+
+async def _read_lines(request: Request) -> AsyncIterator[bytes]:
+    """Yield the non-empty lines of the request body as it streams in."""
+    buffer = b""
+    async for data in request.stream():
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _read_batch(request: Request) -> AsyncIterator[object]:
+    """Yield the raw items of a JSON array or NDJSON request body."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(NDJSON_MEDIA_TYPE):
+        async for line in _read_lines(request):
+            yield from_json(line)
+        return
+
+    items = from_json(await request.body())
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of messages")
+    for item in items:
+        yield item
+
+
+@router.post(
+    "/conversations/{conversation_id}/messages:batch",
+    response_model=MessageBatchOut,
+    status_code=status.HTTP_201_CREATED,
+    # the body is read by hand, so describe it for the docs
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": MessageBatchItem.model_json_schema(),
+                    }
+                },
+                NDJSON_MEDIA_TYPE: {
+                    "schema": MessageBatchItem.model_json_schema()
+                },
+            },
+        }
+    },
+)
+async def send_messages_batch(
+    conversation_id: int,
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    loaders: Annotated[Loaders, Depends(get_loaders)],
+    chunk_size: int = Query(
+        1000,
+        ge=1,
+        le=10_000,
+        description="Number of messages inserted and committed together",
+    ),
+) -> MessageBatchOut:
+    """Import many messages into a conversation in one request.
+
+    The body is either a JSON array of `{"user_id": ..., "text": ...}`
+    items or, with `Content-Type: application/x-ndjson`, one such object per
+    line, read and inserted while it streams in. Participants are looked up
+    once for the whole batch, messages are written with multi-row INSERTs
+    committed every `chunk_size` messages, and a single `messages.created`
+    event is published for the batch instead of one per message.
+
+    Items are checked as they are read. When one is rejected, the chunks
+    committed before it stay imported; the error says how many there were.
+    """
+    conv = await loaders.conversations.load(conversation_id)
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    participants = (conv.user_a_id, conv.user_b_id)
+    # bulk INSERTs are not seen by the flush-time tag tracking
+    tags = (
+        f"conversation:{conv.id}:messages",
+        f"conversation:users:{conv.user_a_id}:{conv.user_b_id}",
+        f"inbox:{conv.user_a_id}",
+        f"inbox:{conv.user_b_id}",
+    )
+    rows: list[dict[str, object]] = []
+    inserted = 0
+
+    async def insert_rows() -> None:
+        nonlocal rows, inserted
+        result: Result[tuple[int, int, datetime]] = await db.execute(
+            insert(Message).returning(
+                Message.id, Message.user_id, Message.created_at
+            ),
+            rows,
+        )
+        newest = max(result, key=lambda row: row.id)
+        await db.execute(
+            _record_last_message(
+                conv, newest.id, newest.user_id, newest.created_at
+            )
+        )
+        mark_stale(db, *tags)
+        await db.commit()
+        inserted += len(rows)
+        rows = []
+
+    index = 0
+    try:
+        async for raw in _read_batch(request):
+            item = MessageBatchItem.model_validate(raw)
+            if item.user_id not in participants:
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Message {index}: user {item.user_id} is not a "
+                    f"participant in the conversation ({inserted} messages "
+                    "imported before it)",
+                )
+            rows.append(
+                {
+                    "conversation_id": conv.id,
+                    "user_id": item.user_id,
+                    "text": item.text,
+                }
+            )
+            index += 1
+            if len(rows) >= chunk_size:
+                await insert_rows()
+        if rows:
+            await insert_rows()
+    except ValueError as exc:  # malformed JSON or an invalid message
+        if isinstance(exc, ValidationError):
+            error = exc.errors()[0]
+            loc = ".".join(map(str, error["loc"]))
+            msg = error["msg"].removeprefix("Value error, ")
+            reason = f"{loc}: {msg}" if loc else msg
+        else:
+            reason = str(exc)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Message {index}: {reason} ({inserted} messages "
+            "imported before it)",
+        ) from None
+    finally:
+        if inserted:
+            await _publish_batch(conv, inserted)
+
+    return MessageBatchOut(conversation_id=conv.id, inserted=inserted)
+
+
+async def _publish_batch(conv: ConversationOut, inserted: int) -> None:
+    # One event for the whole batch; clients refetch the conversation
+    # instead of receiving thousands of `message.created` events.
+    try:
+        await ws_manager.publish_event(
+            (
+                f"conversation:{conv.id}",
+                f"user:{conv.user_a_id}",
+                f"user:{conv.user_b_id}",
+            ),
+            "messages.created",
+            MessageBatchOut(conversation_id=conv.id, inserted=inserted),
+        )
+    except Exception as exc:  # log the exception instead of silently passing
+        logger.exception("Failed to broadcast message batch: %s", exc)
+
+
+@router.post(
+    "/conversations/{conversation_id}/read",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def mark_conversation_read(
+    conversation_id: int,
+    read: ConversationRead,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    loaders: Annotated[Loaders, Depends(get_loaders)],
+) -> None:
+    """Mark every message in a conversation as read by one participant."""
+    conv = await loaders.conversations.load(conversation_id)
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    await _check_participant(loaders, conv, read.user_id)
+
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conv.id)
+        .values(
+            {
+                _last_read_column(conv, read.user_id): (
+                    Conversation.last_message_id
+                )
+            }
+        )
+    )
+    mark_stale(db, f"inbox:{read.user_id}")
+    await db.commit()
+
+
 @router.get("/conversations", response_model=list[ConversationOut])
+@cache.cached(
+    "conversations:list",
+    tags=["conversations"],
+    ttl=3600,
+    stale_ttl=60,
+    local_ttl=5,
+    response_model=list[ConversationOut],
+)
 async def list_conversations(
-    db: Annotated[AsyncSession, Depends(get_async_db)]
+    db: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> list[Conversation]:
     """Return all conversations."""
     result = await db.execute(select(Conversation))
@@ -123,46 +464,388 @@ async def list_conversations(
     return conversations
 
 
+@router.get("/conversations/export")
+async def export_conversations(
+    request: Request,
+    export_format: ExportFormatQuery = ExportFormat.NDJSON,
+    fetch_size: FetchSizeQuery = DEFAULT_FETCH_SIZE,
+) -> StreamingResponse:
+    """Stream all conversations with bounded memory."""
+    return export_response(
+        read_session(request),
+        select(Conversation.__table__).order_by(Conversation.id),
+        ConversationOut,
+        export_format,
+        fetch_size,
+    )
+
+
+@router.get("/conversations/{conversation_id}/messages/export")
+async def export_messages(
+    conversation_id: int,
+    request: Request,
+    loaders: Annotated[Loaders, Depends(get_loaders)],
+    export_format: ExportFormatQuery = ExportFormat.NDJSON,
+    fetch_size: FetchSizeQuery = DEFAULT_FETCH_SIZE,
+) -> StreamingResponse:
+    """Stream a conversation's full history (oldest first)."""
+    if await loaders.conversations.load(conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return export_response(
+        read_session(request),
+        select(
+            Message.id,
+            Message.conversation_id,
+            Message.user_id,
+            Message.text,
+            Message.created_at,
+        )
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at, Message.id),
+        MessageOut,
+        export_format,
+        fetch_size,
+    )
+
+
 @router.get(
     "/conversations/by_users", response_model=ConversationWithMessagesOut
 )
+@cache.cached(
+    "conversation:users:{user_a}:{user_b}:{limit}:{before}",
+    tags=["conversation:users:{user_a}:{user_b}"],
+    ttl=3600,
+    stale_ttl=60,
+    local_ttl=5,
+    response_model=ConversationWithMessagesOut,
+)
 async def get_conversation_by_users(
-    db: Annotated[AsyncSession, Depends(get_async_db)],
-    user_a: str = Query(..., description="Username of the first user (user_a)"),
-    user_b: str = Query(
-        ..., description="Username of the second user (user_b)"
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    user_a: int = Query(..., description="ID of the first user (user_a)"),
+    user_b: int = Query(..., description="ID of the second user (user_b)"),
+    limit: int = Query(
+        50, ge=1, le=200, description="Maximum number of messages to return"
+    ),
+    before: str | None = Query(
+        None,
+        max_length=200,
+        description="Cursor from a previous page's `next_cursor`; only "
+        "messages older than it are returned",
     ),
 ) -> ConversationWithMessagesOut:
     """
-    Find a conversation by two usernames provided as separate query params.
+    Find a conversation by two user IDs provided as separate query params.
+
+    Messages are paginated newest -> oldest using keyset pagination on
+    `(created_at, id)`, so every page costs the same regardless of how far
+    back the client has scrolled.
     """
     if user_a == user_b:
         raise HTTPException(
-            status_code=400, detail="Usernames must be different"
+            status_code=400, detail="User IDs must be different"
         )
 
     result = await db.execute(
         select(Conversation).where(
-            Conversation.user_a_id == int(user_a),
-            Conversation.user_b_id == int(user_b),
+            Conversation.user_a_id == user_a,
+            Conversation.user_b_id == user_b,
         )
     )
     conversation = result.scalar_one_or_none()
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Fetch messages for this conversation, newest first
-    result = await db.execute(
+    # Fetch one extra row to find out whether an older page exists
+    query = (
         select(Message)
         .where(Message.conversation_id == conversation.id)
-        .order_by(Message.created_at.desc())
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit + 1)
     )
+    if before is not None:
+        created_at, message_id = decode_cursor(before)
+        query = query.where(
+            tuple_(Message.created_at, Message.id)
+            < tuple_(created_at, message_id)
+        )
+    result = await db.execute(query)
     messages = result.scalars().all()
 
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        last = messages[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
     return ConversationWithMessagesOut(
         id=conversation.id,
         user_a_id=conversation.user_a_id,
         user_b_id=conversation.user_b_id,
         created_at=conversation.created_at,
         messages=messages,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/users/{user_id}/conversations", response_model=InboxOut)
+@cache.cached(
+    "inbox:{user_id}:{limit}:{before}",
+    tags=["inbox:{user_id}"],
+    ttl=3600,
+    stale_ttl=60,
+    local_ttl=5,
+    response_model=InboxOut,
+)
+async def get_inbox(
+    user_id: int,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: int = Query(
+        50, ge=1, le=200, description="Maximum number of conversations"
+    ),
+    before: str | None = Query(
+        None,
+        description="Cursor from a previous page's `next_cursor`; only "
+        "conversations less recently active than it are returned",
+    ),
+) -> InboxOut:
+    """Return a user's conversations, most recently active first.
+
+    Each conversation comes with a preview of its last message and the
+    number of messages the other participant sent since the user last read
+    it. Everything is read in one query through the denormalized
+    `last_message_id`/`last_message_at` columns and their per-participant
+    indexes, instead of one `by_users` call per conversation.
+    """
+    read_id = case(
+        (Conversation.user_a_id == user_id, Conversation.user_a_last_read_id),
+        else_=Conversation.user_b_last_read_id,
+    )
+    unread = aliased(Message)
+    unread_count = (
+        select(func.count())
+        .where(
+            unread.conversation_id == Conversation.id,
+            unread.user_id != user_id,
+            unread.id > func.coalesce(read_id, 0),
+        )
+        .scalar_subquery()
+    )
+    # Fetch one extra row to find out whether another page exists
+    query = (
+        select(
+            Conversation,
+            Message.id,
+            Message.user_id,
+            func.substr(Message.text, 1, PREVIEW_LENGTH),
+            Message.created_at,
+            unread_count,
+        )
+        .outerjoin(Message, Message.id == Conversation.last_message_id)
+        .where(
+            or_(
+                Conversation.user_a_id == user_id,
+                Conversation.user_b_id == user_id,
+            )
+        )
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        last_message_at, conversation_id = decode_cursor(before)
+        query = query.where(
+            tuple_(Conversation.last_message_at, Conversation.id)
+            < tuple_(last_message_at, conversation_id)
+        )
+    rows = (await db.execute(query)).all()
+
+    if not rows and before is None:
+        # tell users without conversations apart from unknown ones
+        if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.last_message_at, last.id)
+
+    return InboxOut(
+        conversations=[
+            InboxConversationOut(
+                id=conv.id,
+                user_a_id=conv.user_a_id,
+                user_b_id=conv.user_b_id,
+                created_at=conv.created_at,
+                last_message_at=conv.last_message_at,
+                last_message=(
+                    None
+                    if message_id is None
+                    else MessagePreviewOut(
+                        id=message_id,
+                        user_id=sender_id,
+                        text=text,
+                        created_at=sent_at,
+                    )
+                ),
+                unread_count=count,
+            )
+            for conv, message_id, sender_id, text, sent_at, count in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+# Query parameters shared by the search endpoints
+SearchQuery = Annotated[
+    str,
+    Query(
+        min_length=1,
+        max_length=256,
+        description='Words to look for; supports "quoted phrases", `or` '
+        "and `-excluded` words",
+    ),
+]
+SearchLimitQuery = Annotated[
+    int, Query(ge=1, le=100, description="Maximum number of results")
+]
+SearchCursorQuery = Annotated[
+    str | None,
+    Query(
+        description="Cursor from a previous page's `next_cursor`; only "
+        "results ranked after it are returned",
+    ),
+]
+
+
+async def _search_messages(
+    db: AsyncSession,
+    scope: ColumnElement[bool],
+    q: str,
+    limit: int,
+    before: str | None,
+) -> MessageSearchOut:
+    """Return one page of the messages matching both `scope` and `q`.
+
+    Matches are found through the GIN index on `(conversation_id,
+    search_vector)`. The newest `SEARCH_MAX_CANDIDATES` of them are ranked
+    with `ts_rank`, best first, with keyset pagination on `(rank, id)`.
+    Snippets are only built for the rows of the page.
+    """
+    tsquery = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), q)
+    candidates: Select[tuple[int]] = (
+        select(Message.id)
+        .where(scope, Message.search_vector.bool_op("@@")(tsquery))
+        .order_by(Message.id.desc())
+        .limit(SEARCH_MAX_CANDIDATES)
+    )
+    rank = func.ts_rank(Message.search_vector, tsquery)
+    # Fetch one extra row to find out whether another page exists
+    page = (
+        select(
+            Message.id,
+            Message.conversation_id,
+            Message.user_id,
+            Message.created_at,
+            Message.text,
+            rank.label("rank"),
+        )
+        .where(Message.id.in_(candidates))
+        .order_by(rank.desc(), Message.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        after_rank, message_id = decode_rank_cursor(before)
+        page = page.where(
+            tuple_(rank, Message.id) < tuple_(after_rank, message_id)
+        )
+    page = page.subquery()
+    headline = func.ts_headline(
+        cast(SEARCH_CONFIG, REGCONFIG), page.c.text, tsquery, HEADLINE_OPTIONS
+    )
+    rows = (
+        await db.execute(
+            select(
+                page.c.id,
+                page.c.conversation_id,
+                page.c.user_id,
+                page.c.created_at,
+                page.c.rank,
+                headline,
+            ).order_by(page.c.rank.desc(), page.c.id.desc())
+        )
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+
+    return MessageSearchOut(
+        results=[
+            MessageSearchHit(
+                id=message_id,
+                conversation_id=conversation_id,
+                user_id=sender_id,
+                created_at=created_at,
+                rank=message_rank,
+                snippet=html.escape(snippet)
+                .replace(MATCH_START, "<mark>")
+                .replace(MATCH_END, "</mark>"),
+            )
+            for (
+                message_id,
+                conversation_id,
+                sender_id,
+                created_at,
+                message_rank,
+                snippet,
+            ) in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get(
+    "/conversations/{conversation_id}/messages/search",
+    response_model=MessageSearchOut,
+)
+async def search_conversation_messages(
+    conversation_id: int,
+    q: SearchQuery,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    loaders: Annotated[Loaders, Depends(get_loaders)],
+    limit: SearchLimitQuery = 20,
+    before: SearchCursorQuery = None,
+) -> MessageSearchOut:
+    """Search the text of one conversation's messages, best match first."""
+    if await loaders.conversations.load(conversation_id) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return await _search_messages(
+        db, Message.conversation_id == conversation_id, q, limit, before
+    )
+
+
+@router.get("/users/{user_id}/messages/search", response_model=MessageSearchOut)
+async def search_user_messages(
+    user_id: int,
+    q: SearchQuery,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    loaders: Annotated[Loaders, Depends(get_loaders)],
+    limit: SearchLimitQuery = 20,
+    before: SearchCursorQuery = None,
+) -> MessageSearchOut:
+    """Search the messages of every conversation a user takes part in."""
+    if await loaders.users.load(user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    conversation_ids: Select[tuple[int]] = select(Conversation.id).where(
+        or_(
+            Conversation.user_a_id == user_id,
+            Conversation.user_b_id == user_id,
+        )
+    )
+    return await _search_messages(
+        db, Message.conversation_id.in_(conversation_ids), q, limit, before
     )
@@ -0,0 +1,202 @@
+import os
+import zlib
+from enum import StrEnum
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional, only needed for `br` responses
+    brotli = None
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Media types worth compressing, comma-separated
+COMPRESSION_TYPES = frozenset(
+    media_type.strip().lower()
+    for media_type in os.getenv(
+        "COMPRESSION_TYPES",
+        "application/json,application/x-ndjson,text/plain,text/csv",
+    ).split(",")
+    if media_type.strip()
+)
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+
+class Encoding(StrEnum):
+    BROTLI = "br"
+    GZIP = "gzip"
+
+
+# In order of preference when a client accepts several equally
+SUPPORTED = (
+    (Encoding.BROTLI, Encoding.GZIP) if brotli is not None else (Encoding.GZIP,)
+)
+
+
+def negotiate(accept_encoding: str | None) -> Encoding | None:
+    """The encoding to answer an `Accept-Encoding` header with, if any."""
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in SUPPORTED:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type in COMPRESSION_TYPES
+
+
+def compress(body: bytes, encoding: Encoding) -> bytes:
+    if encoding is Encoding.BROTLI:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, wbits=31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class _StreamCompressor:
+    """Compresses a body that is sent in several chunks."""
+
+    def __init__(self, encoding: Encoding) -> None:
+        self.encoding = encoding
+        if encoding is Encoding.BROTLI:
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, wbits=31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding is Encoding.BROTLI:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding is Encoding.BROTLI:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def add_vary(headers: MutableHeaders) -> None:
+    """Mark a response as depending on the request's `Accept-Encoding`."""
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """Compresses responses with brotli or gzip, as the client accepts.
+
+    Only bodies of at least `min_size` bytes with a media type listed in
+    `COMPRESSION_TYPES` are compressed; streamed bodies are compressed as
+    they are sent. Brotli requires the `brotli` extra. Responses that are
+    already encoded, such as pre-compressed cache hits, pass through as
+    they are.
+    """
+
+    def __init__(
+        self, app: ASGIApp, min_size: int = COMPRESSION_MIN_SIZE
+    ) -> None:
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        # the start message, held back until the first body chunk shows
+        # whether the body is worth compressing
+        start: Message | None = None
+        compressor: _StreamCompressor | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if not compressible(headers.get("content-type")):
+                    await send(message)
+                    return
+                add_vary(headers)
+                if (
+                    encoding is None
+                    or "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] in (204, 304)
+                ):
+                    await send(message)
+                    return
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                # the start is only held back when there is an encoding
+                assert encoding is not None
+                headers = MutableHeaders(scope=start)
+                if not more_body:
+                    if len(body) >= self.min_size:
+                        body = compress(body, encoding)
+                        headers["Content-Encoding"] = encoding
+                        headers["Content-Length"] = str(len(body))
+                        _weaken_etag(headers)
+                    await send(start)
+                    await send({"type": message["type"], "body": body})
+                    return
+                # the length of a streamed body isn't known up front
+                compressor = _StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                _weaken_etag(headers)
+                await send(start)
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send(
+                    {
+                        "type": message["type"],
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    # the compressed bytes differ from those a strong ETag vouches for
+    etag = headers.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
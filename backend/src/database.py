@@ -1,44 +1,313 @@
+import math
 import os
-from collections.abc import AsyncGenerator, Generator
+import random
+import time
+import uuid
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from dataclasses import dataclass
 
-from sqlalchemy import create_engine
+from fastapi import APIRouter, Request
+from sqlalchemy import event, make_url
+from sqlalchemy.engine.interfaces import DBAPIConnection
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Base is re-exported for Alembic's env.py
+from src.models import Base
 
-SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_SQLALCHEMY_DATABASE_URL")
+# Comma-separated URLs of read replicas of the primary database (optional)
+ASYNC_SQLALCHEMY_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("ASYNC_SQLALCHEMY_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# Seconds replicas may lag behind the primary: clients read from the primary
+# for this long after a write.
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "2"))
+# Cookie holding the time until which a client reads from the primary
+PRIMARY_COOKIE = "db_primary_until"
+
+# Async callbacks awaited after every successful commit of an async session
+# (e.g. cache invalidation in `src.cache`)
+post_commit_hooks: list[Callable[[AsyncSession], Awaitable[None]]] = []
+
+
+class HookedAsyncSession(AsyncSession):
+    """AsyncSession that awaits `post_commit_hooks` after each commit."""
+
+    async def commit(self) -> None:
+        await super().commit()
+        for hook in post_commit_hooks:
+            await hook(self)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Async engine and connection pool settings."""
+
+    # Connections kept open, and extra ones opened under bursts of load
+    pool_size: int = 10
+    max_overflow: int = 10
+    # Seconds a request waits for a free connection before failing
+    pool_timeout: float = 30
+    # Seconds after which a connection is replaced (-1 keeps it forever)
+    pool_recycle: int = 1800
+    # Check connections with a cheap round trip before handing them out
+    pool_pre_ping: bool = True
+    # Prepared statements cached per asyncpg connection
+    statement_cache_size: int = 100
+    # Run behind PgBouncer in transaction pooling mode, where a connection
+    # may be a different server session on every transaction, so prepared
+    # statements can neither be cached nor reuse names.
+    pgbouncer: bool = False
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Read the settings from `DB_*` environment variables."""
+        return cls(
+            pool_size=int(os.getenv("DB_POOL_SIZE", cls.pool_size)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", cls.max_overflow)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", cls.pool_timeout)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", cls.pool_recycle)),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", cls.pool_pre_ping),
+            statement_cache_size=int(
+                os.getenv("DB_STATEMENT_CACHE_SIZE", cls.statement_cache_size)
+            ),
+            pgbouncer=_env_bool("DB_PGBOUNCER", cls.pgbouncer),
+        )
+
+    def engine_kwargs(self, url: str) -> dict[str, object]:
+        """Keyword arguments for `create_async_engine(url, ...)`."""
+        kwargs: dict[str, object] = {
+            "poolclass": InstrumentedPool,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_recycle": self.pool_recycle,
+            "pool_pre_ping": self.pool_pre_ping,
+        }
+        if make_url(url).get_driver_name() != "asyncpg":
+            return kwargs
 
-# Sync engine (for existing code and migrations)
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        cache_size = 0 if self.pgbouncer else self.statement_cache_size
+        connect_args: dict[str, object] = {
+            # asyncpg's own cache and SQLAlchemy's cache of prepared
+            # statements on each connection
+            "statement_cache_size": cache_size,
+            "prepared_statement_cache_size": cache_size,
+        }
+        if self.pgbouncer:
+            connect_args["prepared_statement_name_func"] = (
+                lambda: f"__asyncpg_{uuid.uuid4()}__"
+            )
+        kwargs["connect_args"] = connect_args
+        return kwargs
 
-# Async engine
-async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts take.
+
+    A checkout either reuses an idle connection, opens a new one within
+    `pool_size + max_overflow`, or waits for one to be returned; the time
+    spent tells whether the pool is too small for the load.
+    """
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)  # type: ignore[arg-type]
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def metrics(self) -> dict[str, int | float]:
+        return {
+            "pool_size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            # connections open beyond pool_size (negative while the pool
+            # has not opened all of its connections yet)
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "avg_wait_ms": self.wait_seconds / max(self.checkouts, 1) * 1000,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+        }
+
+
+# Async engine, created by `init_db` when the app starts rather than on
+# import, so importing the app (tools, tests, reloads) never touches the
+# database. Sessions are bound to it once it exists.
+async_engine: AsyncEngine | None = None
 AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+    class_=HookedAsyncSession, expire_on_commit=False
 )
 
-# Import Base from the shared base model (contains id and created_at)
-from src.models import Base  # noqa: E402
+# Replica engines, also created by `init_db`; replica sessions are bound to
+# one of them when they are opened.
+replica_engines: list[AsyncEngine] = []
+ReplicaSessionLocal = async_sessionmaker(expire_on_commit=False)
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
 
+def _enable_foreign_keys(
+    dbapi_connection: DBAPIConnection, connection_record: ConnectionPoolEntry
+) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
 
-# Dependency for getting DB session (sync)
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def _create_engine(url: str, settings: PoolSettings) -> AsyncEngine:
+    engine = create_async_engine(url, **settings.engine_kwargs(url))
+    if engine.dialect.name == "sqlite":
+        # SQLite only enforces foreign keys when each connection asks for it,
+        # and endpoints rely on them to reject users that don't exist
+        event.listen(engine.sync_engine, "connect", _enable_foreign_keys)
+    return engine
+
+
+async def init_db() -> None:
+    """Create the async engines and bind the session factories to them.
+
+    The schema is managed by Alembic (see entrypoint.sh). For throwaway
+    development databases only, `DB_CREATE_ALL=true` creates missing tables
+    from the models instead.
+    """
+    global async_engine
+    if ASYNC_SQLALCHEMY_DATABASE_URL is None:
+        raise RuntimeError("ASYNC_SQLALCHEMY_DATABASE_URL is not set")
+    settings = PoolSettings.from_env()
+    async_engine = _create_engine(ASYNC_SQLALCHEMY_DATABASE_URL, settings)
+    AsyncSessionLocal.configure(bind=async_engine)
+    replica_engines[:] = [
+        _create_engine(url, settings) for url in ASYNC_SQLALCHEMY_REPLICA_URLS
+    ]
+    if _env_bool("DB_CREATE_ALL", False):
+        for engine in (async_engine, *replica_engines):
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db() -> None:
+    global async_engine
+    for engine in replica_engines:
+        await engine.dispose()
+    replica_engines.clear()
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
 
 
 # Dependency for getting async DB session
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+def read_session(request: Request) -> AsyncSession:
+    """Open a session for read-only work on behalf of `request`.
+
+    It uses a random replica, or the primary when there are no replicas or
+    the client wrote recently enough that replicas may not have its write
+    yet. Replica sessions are flagged with `info["replica"]`.
+    """
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    if not replica_engines or time.time() < primary_until:
+        return AsyncSessionLocal()
+    session = ReplicaSessionLocal(bind=random.choice(replica_engines))
+    session.info["replica"] = True
+    return session
+
+
+# Dependency for getting async DB session for read-only routes
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with read_session(request) as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """Pins clients to the primary for a while after they write.
+
+    Every successful request with a non-safe method sets a short-lived
+    cookie that makes `read_session` skip the replicas until they have
+    caught up, so clients always see their own writes.
+    """
+
+    SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] in self.SAFE_METHODS
+            or not replica_engines
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+            ):
+                until = time.time() + REPLICA_MAX_LAG
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until:.3f}; "
+                    f"Max-Age={math.ceil(REPLICA_MAX_LAG)}; Path=/; "
+                    "HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+router = APIRouter()
+
+
+@router.get("/db/pool")
+def pool_metrics() -> dict[str, dict[str, int | float]]:
+    """Live connection pool usage and checkout wait times of this worker."""
+    engines = {f"replica_{i}": e for i, e in enumerate(replica_engines, 1)}
+    if async_engine is not None:
+        engines = {"primary": async_engine, **engines}
+    return {
+        name: engine.pool.metrics()
+        for name, engine in engines.items()
+        if isinstance(engine.pool, InstrumentedPool)
+    }
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from enum import StrEnum
+from typing import cast
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
+from pydantic_core import from_json, to_json
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from redis.typing import EncodableT
+
+from src.cache import FillDeferred, redis
+from src.responses import FastJSONResponse
+from src.ws import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# Redis list the API pushes jobs to and the workers pop them from
+QUEUE_KEY = "jobs:queue"
+# Pub/sub channel announcing every finished job to the API workers
+DONE_CHANNEL = "jobs:done"
+# Seconds a job's status and result can be read after it was submitted
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+# Seconds identical submissions reuse a pending job; a job whose worker
+# died is submitted anew after this
+JOB_DEDUP_TTL = int(os.getenv("JOB_DEDUP_TTL", "300"))
+# Jobs each worker process runs at once, i.e. the size of its process pool
+WORKER_CONCURRENCY = int(
+    os.getenv("JOB_WORKER_CONCURRENCY", str(os.cpu_count() or 1))
+)
+# Longest a request may wait for a job before getting a 202 instead
+MAX_WAIT = 30
+
+
+class JobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+FINISHED = (JobStatus.DONE, JobStatus.FAILED)
+
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: JobStatus
+    # what the job's handler returned, once it is done
+    result: object | None = None
+    error: str | None = None
+
+
+class JobPending(FillDeferred):
+    """A request stopped waiting for `job`, which is still running.
+
+    Answered with `202 Accepted` pointing at the job (see
+    `job_pending_handler`); the job fills the cache entry itself.
+    """
+
+    def __init__(self, job: JobOut) -> None:
+        super().__init__(job.id)
+        self.job = job
+
+
+# Runs one kind of job in the worker: called with the worker's process pool
+# and the job's parameters, it returns the result as JSON.
+Handler = Callable[..., Awaitable[bytes]]
+
+handlers: dict[str, Handler] = {}
+
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Register the coroutine that runs jobs of `kind` in the worker.
+
+    CPU-bound work belongs in the pool it is given (through
+    `loop.run_in_executor`), so the worker's event loop stays free to take
+    and report other jobs.
+    """
+
+    def decorator(func: Handler) -> Handler:
+        handlers[kind] = func
+        return func
+
+    return decorator
+
+
+class JobQueue:
+    """Submits jobs to the workers and waits for them to finish.
+
+    A job is a Redis hash `job:<id>` plus an entry in the `QUEUE_KEY` list.
+    Submissions with the same kind and parameters share the job that is
+    still pending, so a burst of requests for the same value computes it
+    once. Workers announce finished jobs on `DONE_CHANNEL`, which wakes the
+    requests waiting for them and notifies WebSocket clients subscribed to
+    `job:<id>`.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+        self._waiters: dict[str, set[asyncio.Future[None]]] = {}
+        self._listener: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen_for_finished())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def submit(self, kind: str, **params: object) -> JobOut:
+        """Queue a job, or return the pending one with the same params."""
+        dedup_key = f"jobkey:{kind}:" + to_json(sorted(params.items())).decode()
+        job_id = uuid.uuid4().hex
+        if not await self.redis.set(
+            dedup_key, job_id, nx=True, ex=JOB_DEDUP_TTL
+        ):
+            pending = cast(bytes | None, await self.redis.get(dedup_key))
+            if pending is not None:
+                pending_id = pending.decode()
+                job = await self.get(pending_id)
+                # it may be submitted this very moment
+                return job or JobOut(
+                    id=pending_id, kind=kind, status=JobStatus.QUEUED
+                )
+            # finished in the meantime; its result may already be stale
+            await self.redis.set(dedup_key, job_id, ex=JOB_DEDUP_TTL)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                f"job:{job_id}",
+                mapping={
+                    "kind": kind,
+                    "status": JobStatus.QUEUED,
+                    "dedup_key": dedup_key,
+                },
+            )
+            pipe.expire(f"job:{job_id}", JOB_TTL)
+            pipe.lpush(
+                QUEUE_KEY,
+                to_json({"id": job_id, "kind": kind, "params": params}),
+            )
+            await pipe.execute()
+        return JobOut(id=job_id, kind=kind, status=JobStatus.QUEUED)
+
+    async def get(self, job_id: str) -> JobOut | None:
+        fields = cast(
+            dict[bytes, bytes], await self.redis.hgetall(f"job:{job_id}")
+        )
+        if b"kind" not in fields:
+            return None
+        result = fields.get(b"result")
+        error = fields.get(b"error")
+        return JobOut(
+            id=job_id,
+            kind=fields[b"kind"].decode(),
+            status=JobStatus(fields[b"status"].decode()),
+            result=None if result is None else from_json(result),
+            error=None if error is None else error.decode(),
+        )
+
+    async def wait(self, job_id: str, timeout: float) -> JobOut | None:
+        """Wait up to `timeout` seconds for a job to finish.
+
+        Returns its state at that point, which is still queued or running
+        when it didn't finish in time, or None for an unknown job.
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(job_id, set())
+        # registered before reading the status, so no announcement is missed
+        waiters.add(future)
+        try:
+            job = await self.get(job_id)
+            if job is None or job.status in FINISHED or timeout <= 0:
+                return job
+            try:
+                await asyncio.wait_for(future, timeout)
+            except TimeoutError:
+                pass
+            return await self.get(job_id)
+        finally:
+            waiters.discard(future)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+    def _finished(self, job: JobOut) -> None:
+        for future in self._waiters.get(job.id, ()):
+            if not future.done():
+                future.set_result(None)
+        # every API worker hears about the job, so only deliver to this
+        # worker's own clients
+        ws_manager.deliver_event(f"job:{job.id}", "job.finished", job)
+
+    async def _listen_for_finished(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(DONE_CHANNEL)
+                    async for event in pubsub.listen():
+                        if event["type"] == "message":
+                            self._finished(
+                                JobOut.model_validate_json(event["data"])
+                            )
+            except RedisError:
+                # waiting requests fall back to their timeout
+                logger.exception("Job listener failed")
+                await asyncio.sleep(1)
+
+
+# Shared instance that other modules can import
+job_queue = JobQueue(redis)
+
+
+class Worker:
+    """Runs queued jobs, at most `concurrency` of them at a time.
+
+    Started as its own process (`python -m src.worker`); handlers run their
+    CPU-bound part in a process pool of the same size. A job is only taken
+    off the queue once a slot is free, so jobs this worker can't start yet
+    stay available to other workers.
+    """
+
+    def __init__(self, redis: Redis, concurrency: int) -> None:
+        self.redis = redis
+        self.executor = ProcessPoolExecutor(concurrency)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running: set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        with self.executor:
+            while True:
+                await self._slots.acquire()
+                try:
+                    item = await self.redis.brpop([QUEUE_KEY], timeout=5)
+                except RedisError:
+                    self._slots.release()
+                    logger.exception("Reading the job queue failed")
+                    await asyncio.sleep(1)
+                    continue
+                if item is None:
+                    self._slots.release()
+                    continue
+                task = asyncio.create_task(self._run(from_json(item[1])))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _run(self, job: dict[str, object]) -> None:
+        job_id, kind = str(job["id"]), str(job["kind"])
+        key = f"job:{job_id}"
+        try:
+            await self.redis.hset(key, "status", JobStatus.RUNNING)
+            params = cast(dict[str, object], job["params"])
+            body = await handlers[kind](self.executor, **params)
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job_id, kind)
+            error = str(exc) or type(exc).__name__
+            done = JobOut(
+                id=job_id, kind=kind, status=JobStatus.FAILED, error=error
+            )
+            fields: dict[EncodableT, EncodableT] = {
+                "status": done.status,
+                "error": error,
+            }
+        else:
+            done = JobOut(
+                id=job_id,
+                kind=kind,
+                status=JobStatus.DONE,
+                result=from_json(body),
+            )
+            fields = {"status": done.status, "result": body}
+        finally:
+            self._slots.release()
+
+        try:
+            dedup_key = await self.redis.hget(key, "dedup_key")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=fields)
+                pipe.expire(key, JOB_TTL)
+                if dedup_key is not None:
+                    # later submissions start over with fresh data
+                    pipe.delete(dedup_key)
+                pipe.publish(DONE_CHANNEL, done.model_dump_json())
+                await pipe.execute()
+        except RedisError:
+            logger.exception("Reporting job %s failed", job_id)
+
+
+router = APIRouter()
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(
+    job_id: str,
+    wait: float = Query(
+        0,
+        ge=0,
+        le=MAX_WAIT,
+        description="Seconds to wait for the job to finish before answering",
+    ),
+) -> JobOut:
+    """Return a job's status, and its result once it is done."""
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def job_pending_handler(
+    request: Request, exc: Exception
+) -> FastJSONResponse:
+    assert isinstance(exc, JobPending)
+    location = request.url_for("get_job", job_id=exc.job.id)
+    return FastJSONResponse(
+        status_code=202,
+        content=to_json(exc.job),
+        headers={"Location": str(location)},
+    )
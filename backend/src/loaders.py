@@ -0,0 +1,150 @@
+import asyncio
+import os
+from collections.abc import Iterable
+from typing import Annotated, Generic, TypeVar
+
+from fastapi import Depends
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import cache
+from src.chat.dtos import ConversationOut
+from src.chat.models import Conversation
+from src.database import get_async_db
+from src.models import Base
+from src.users.dtos import UserOut
+from src.users.models import User
+
+Schema = TypeVar("Schema", bound=BaseModel)
+
+# Seconds loaded rows are shared between requests in this process
+SHARED_TTL = float(os.getenv("LOADER_SHARED_TTL", "5"))
+
+
+class Loader(Generic[Schema]):
+    """Loads rows of one table by id for the duration of a request.
+
+    Ids requested in the same event-loop tick (e.g. through `load_many` or
+    `asyncio.gather`) are fetched together with a single
+    `SELECT ... WHERE id IN (...)`, and each id is fetched at most once per
+    request. With a `shared_ttl`, rows are also kept in the cache's
+    in-process tier under the `<tag>:<id>` cache tag, so they are shared
+    between requests until a commit anywhere invalidates that tag.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        lock: asyncio.Lock,
+        model: type[Base],
+        schema: type[Schema],
+        tag: str,
+        shared_ttl: float = 0,
+    ) -> None:
+        self.session = session
+        self.lock = lock
+        self.model = model
+        self.schema = schema
+        self.tag = tag
+        self.shared_ttl = shared_ttl
+        self._futures: dict[int, asyncio.Future[Schema | None]] = {}
+        self._pending: list[int] = []
+        self._batches: set[asyncio.Task] = set()
+
+    async def load(self, row_id: int) -> Schema | None:
+        """Return the row with `row_id`, or None if it doesn't exist."""
+        return await self._future(row_id)
+
+    async def load_many(self, row_ids: Iterable[int]) -> list[Schema | None]:
+        futures = [self._future(row_id) for row_id in row_ids]
+        return [await future for future in futures]
+
+    def _future(self, row_id: int) -> asyncio.Future[Schema | None]:
+        future = self._futures.get(row_id)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._futures[row_id] = loop.create_future()
+        if self.shared_ttl:
+            body = cache.local.get(self._shared_key(row_id))
+            if body is not None:
+                future.set_result(self.schema.model_validate_json(body))
+                return future
+        if not self._pending:
+            # runs once the current tick has queued all of its ids
+            loop.call_soon(self._dispatch)
+        self._pending.append(row_id)
+        return future
+
+    def _dispatch(self) -> None:
+        row_ids, self._pending = self._pending, []
+        task = asyncio.create_task(self._load_batch(row_ids))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _load_batch(self, row_ids: list[int]) -> None:
+        try:
+            # an AsyncSession runs one statement at a time
+            async with self.lock:
+                generation = cache.local.generation
+                result = await self.session.execute(
+                    select(self.model.__table__).where(
+                        self.model.id.in_(row_ids)
+                    )
+                )
+                rows = {
+                    row.id: self.schema.model_validate(
+                        row, from_attributes=True
+                    )
+                    for row in result
+                }
+        except Exception as exc:
+            for row_id in row_ids:
+                # forget the failure so a later load tries again
+                self._futures.pop(row_id).set_exception(exc)
+            return
+
+        for row_id in row_ids:
+            row = rows.get(row_id)
+            self._futures[row_id].set_result(row)
+            # don't share rows read before a concurrent invalidation
+            if (
+                row is not None
+                and self.shared_ttl
+                and generation == cache.local.generation
+            ):
+                cache.local.set(
+                    self._shared_key(row_id),
+                    row.model_dump_json().encode(),
+                    (f"{self.tag}:{row_id}",),
+                    self.shared_ttl,
+                )
+
+    def _shared_key(self, row_id: int) -> str:
+        return f"loader:{self.tag}:{row_id}"
+
+
+class Loaders:
+    """The loaders of one request, all reading through its session."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        lock = asyncio.Lock()
+        self.users = Loader(session, lock, User, UserOut, "user", SHARED_TTL)
+        self.conversations = Loader(
+            session,
+            lock,
+            Conversation,
+            ConversationOut,
+            "conversation",
+            SHARED_TTL,
+        )
+
+
+# Dependency for getting the request's loaders; they share the request's
+# session from `get_async_db`.
+async def get_loaders(
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> Loaders:
+    return Loaders(db)
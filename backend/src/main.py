@@ -1,14 +1,43 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from src.cache import cache
+from src.cache import router as cache_router
 from src.chat.router import router as chat_router
+from src.compression import CompressionMiddleware
+from src.database import ReadYourWritesMiddleware, close_db, init_db
+from src.database import router as database_router
+from src.jobs import JobPending, job_pending_handler, job_queue
+from src.jobs import router as jobs_router
+from src.timing import TimingMiddleware
+from src.timing import router as timing_router
 from src.todos.router import router as todos_router
 from src.users.router import router as users_router
 from src.ws import router as ws_router
+from src.ws import ws_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    await init_db()
+    # Relay WebSocket events and cache invalidations between workers
+    # for the app's lifetime
+    await ws_manager.start()
+    await cache.start()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await cache.stop()
+    await ws_manager.stop()
+    await close_db()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost",
@@ -23,10 +52,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Send clients' reads to the primary right after they write
+app.add_middleware(ReadYourWritesMiddleware)
+# Compress large JSON and export bodies for clients that accept it
+app.add_middleware(CompressionMiddleware)
+# Outermost, so the whole request is timed
+app.add_middleware(TimingMiddleware)
+
 app.include_router(ws_router)
 app.include_router(todos_router)
 app.include_router(users_router)
 app.include_router(chat_router)
+app.include_router(cache_router)
+app.include_router(database_router)
+app.include_router(jobs_router)
+app.include_router(timing_router)
+
+app.add_exception_handler(JobPending, job_pending_handler)
 
 
 @app.exception_handler(RequestValidationError)
@@ -1,3 +1,5 @@
+from datetime import UTC, datetime
+
 from sqlalchemy import Column, DateTime, Integer
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
@@ -10,9 +12,23 @@ class BaseModel:
 
     Concrete models should inherit both from `Base` and `BaseModel`
     (e.g. `class User(Base, BaseModel):`).
+
+    Inserts fetch server-generated values (`id`) with `INSERT ... RETURNING`
+    while flushing, so new objects never need a `refresh` (an extra SELECT)
+    before being returned.
+
+    `created_at` is set by the application, and the server default only
+    covers rows inserted outside of it: SQLite's `CURRENT_TIMESTAMP` has no
+    fractional seconds, so it sorts before the bound values of keyset
+    cursors from the same second and those cursors would never advance.
     """
 
     __abstract__ = True
+    __mapper_args__: dict[str, object] = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        server_default=func.now(),
+    )
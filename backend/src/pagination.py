@@ -0,0 +1,49 @@
+import base64
+import binascii
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> tuple[str, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    position, row_id = raw.rsplit("|", 1)
+    return position, int(row_id)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a `(created_at, id)` keyset position as an opaque cursor."""
+    return _encode(f"{created_at.isoformat()}|{row_id}")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by `encode_cursor`.
+
+    Raises a 400 HTTPException when the cursor is malformed so that
+    clients get a clear error instead of a 500.
+    """
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Encode a `(rank, id)` position in ranked results as a cursor."""
+    # repr() round-trips the float exactly, so no row is skipped or repeated
+    return _encode(f"{rank!r}|{row_id}")
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    """Decode a cursor produced by `encode_rank_cursor` (400 if invalid)."""
+    try:
+        rank, row_id = _decode(cursor)
+        return float(rank), row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
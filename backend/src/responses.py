@@ -0,0 +1,28 @@
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional, only needed for faster JSON rendering
+    orjson = None  # type: ignore[assignment]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that sends already rendered JSON bytes as they are.
+
+    For responses built by hand. Routes with a `response_model` keep
+    FastAPI's default rendering, which serializes with pydantic-core and is
+    faster than rendering the dumped objects again. Bytes, such as the
+    output of a Pydantic `TypeAdapter.dump_json`, are sent unchanged:
+
+        return FastJSONResponse(adapter.dump_json(todos))
+
+    Other content is rendered with orjson when the `orjson` extra is
+    installed, and exactly like `JSONResponse` otherwise.
+    """
+
+    def render(self, content: object) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(content)
@@ -0,0 +1,284 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExceptionContext
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Requests issuing more SQL statements than this are logged as likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Whether responses carry their timings in a `Server-Timing` header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true")
+
+# Where a request spends its time besides its own code
+COMPONENTS = ("db", "cache", "broadcast")
+
+
+@dataclass
+class RequestTimings:
+    """Time spent by one request in the database, Redis and broadcasts."""
+
+    # seconds per component
+    durations: defaultdict[str, float] = field(
+        default_factory=lambda: defaultdict(float)
+    )
+    queries: int = 0
+    # how often each SQL statement ran, to point at the culprit of an N+1
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def server_timing(self, total: float) -> str:
+        metrics = [
+            f'db;dur={self.durations["db"] * 1000:.2f};'
+            f'desc="{self.queries} queries"',
+            *(
+                f"{name};dur={self.durations[name] * 1000:.2f}"
+                for name in COMPONENTS[1:]
+            ),
+            f"total;dur={total * 1000:.2f}",
+        ]
+        return ", ".join(metrics)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def track(component: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's timings."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[component] += time.perf_counter() - start
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(
+    conn: Connection,
+    cursor: object,
+    statement: str,
+    parameters: object,
+    context: object,
+    executemany: bool,
+) -> None:
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(
+    conn: Connection,
+    cursor: object,
+    statement: str,
+    parameters: object,
+    context: object,
+    executemany: bool,
+) -> None:
+    timings = _current.get()
+    started = conn.info.get("query_started")
+    if timings is None or not started:
+        return
+    timings.durations["db"] += time.perf_counter() - started.pop()
+    timings.queries += 1
+    timings.statements[statement] += 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_query(context: ExceptionContext) -> None:
+    # `after_cursor_execute` doesn't run for a failed statement
+    if context.connection is None:
+        return
+    started = context.connection.info.get("query_started")
+    if started:
+        started.pop()
+
+
+class TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> list[object]:
+        with track("cache"):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(Redis):
+    """Redis client whose round trips count as the request's cache time."""
+
+    async def execute_command(self, *args: object, **options: object) -> object:
+        with track("cache"):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> Pipeline:
+        return TimedPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"")
+
+
+class Histogram:
+    """A Prometheus histogram labelled by method and route."""
+
+    def __init__(
+        self, name: str, description: str, buckets: Sequence[float]
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self._counts: dict[tuple[str, str], list[int]] = {}
+        self._sums: defaultdict[tuple[str, str], float] = defaultdict(float)
+
+    def observe(self, labels: tuple[str, str], value: float) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+        # the first bucket whose upper bound is >= value; the last is +Inf
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for (method, route), counts in self._counts.items():
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, count in zip(
+                [*self.buckets, "+Inf"], counts, strict=True
+            ):
+                cumulative += count
+                bucket = f'{labels},le="{bound}"'
+                yield f"{self.name}_bucket{{{bucket}}} {cumulative}"
+            yield f"{self.name}_sum{{{labels}}} {self._sums[method, route]}"
+            yield f"{self.name}_count{{{labels}}} {cumulative}"
+
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to handle a request.", SECONDS
+)
+component_seconds = {
+    name: Histogram(
+        f"http_request_{name}_seconds",
+        f"Time a request spent in {name} calls.",
+        SECONDS,
+    )
+    for name in COMPONENTS
+}
+request_queries = Histogram(
+    "http_request_db_queries",
+    "SQL statements issued per request.",
+    (0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+# Requests flagged as likely N+1, per method and route
+n_plus_one: Counter[tuple[str, str]] = Counter()
+
+
+def _record(scope: Scope, timings: RequestTimings, total: float) -> None:
+    route = scope.get("route")
+    # unmatched paths aren't used as labels, or clients could create any
+    # number of series
+    labels = (scope["method"], getattr(route, "path", "unmatched"))
+    request_seconds.observe(labels, total)
+    for name, histogram in component_seconds.items():
+        histogram.observe(labels, timings.durations[name])
+    request_queries.observe(labels, timings.queries)
+
+    if timings.queries > N_PLUS_ONE_THRESHOLD:
+        n_plus_one[labels] += 1
+        statement, repeats = timings.statements.most_common(1)[0]
+        logger.warning(
+            "Possible N+1: %s %s issued %d SQL statements; ran %d times: %s",
+            *labels,
+            timings.queries,
+            repeats,
+            " ".join(statement.split())[:200],
+        )
+
+
+class TimingMiddleware:
+    """Times every request and where it spends that time.
+
+    Database statements are timed through engine events, Redis calls
+    through `TimedRedis` and broadcasts through `track("broadcast")`. The
+    result goes into `Server-Timing` headers and the histograms served at
+    `/metrics`, and requests issuing more than `N_PLUS_ONE_THRESHOLD` SQL
+    statements are logged. Streamed bodies are timed in full in the
+    histograms, but their header only covers the work before streaming.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and SERVER_TIMING:
+                MutableHeaders(scope=message).append(
+                    "Server-Timing",
+                    timings.server_timing(time.perf_counter() - start),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            _record(scope, timings, time.perf_counter() - start)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Request timing histograms of this worker, in Prometheus format."""
+    lines = [
+        *request_seconds.render(),
+        *(line for h in component_seconds.values() for line in h.render()),
+        *request_queries.render(),
+        "# HELP http_requests_n_plus_one_total Requests flagged as likely N+1.",
+        "# TYPE http_requests_n_plus_one_total counter",
+        *(
+            f'http_requests_n_plus_one_total{{method="{method}",'
+            f'route="{_escape(route)}"}} {count}'
+            for (method, route), count in n_plus_one.items()
+        ),
+    ]
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+
+from sqlalchemy import select
+
+from src.cache import cache
+from src.database import AsyncSessionLocal
+from src.jobs import handler
+from src.todos.dtos import TodoOut
+from src.todos.models import Todo
+
+# Cache settings of `todo:{id}`, shared by the route and the job filling it
+TODO_TTL = 3600
+TODO_STALE_TTL = 60
+
+
+def derive_todo(todo: dict[str, object]) -> dict[str, object]:
+    """The expensive derivation behind `GET /todos/{id}`.
+
+    Runs in a worker's process pool, so it may hold the CPU for as long as
+    it needs without blocking any event loop.
+    """
+    time.sleep(5)  # stands in for the CPU-bound work
+    return todo
+
+
+@handler("todo.derive")
+async def derive_todo_job(executor: Executor, todo_id: int) -> bytes:
+    """Derive a todo and store the result as its `todo:{id}` cache entry."""
+    key = f"todo:{todo_id}"
+    versions = await cache.tag_versions([key])
+    async with AsyncSessionLocal() as session:
+        todo = await session.scalar(select(Todo).where(Todo.id == todo_id))
+    if todo is None:
+        raise LookupError("Todo not found")
+
+    derived = await asyncio.get_running_loop().run_in_executor(
+        executor,
+        derive_todo,
+        TodoOut.model_validate(todo).model_dump(mode="json"),
+    )
+    body = TodoOut.model_validate(derived).model_dump_json().encode()
+    await cache.put(key, versions, body, ttl=TODO_TTL, stale_ttl=TODO_STALE_TTL)
+    return body
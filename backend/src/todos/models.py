@@ -9,3 +9,6 @@ class Todo(Base, BaseModel):
     title = Column(String(20), nullable=False)
     description = Column(String(100), nullable=True)
     due_date = Column(Date, nullable=False)
+
+    def cache_tags(self) -> tuple[str, ...]:
+        return ("todos", f"todo:{self.id}")
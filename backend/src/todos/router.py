@@ -1,30 +1,42 @@
-import asyncio
-import json
-import os
+import logging
 from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from redis.asyncio import Redis
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_async_db
+from src.cache import cache
+from src.database import get_async_db, get_read_db, read_session
+from src.export import (
+    DEFAULT_FETCH_SIZE,
+    ExportFormat,
+    ExportFormatQuery,
+    FetchSizeQuery,
+    export_response,
+)
+from src.jobs import MAX_WAIT, JobOut, JobPending, JobStatus, job_queue
 from src.todos.dtos import TodoCreate, TodoOut
+from src.todos.jobs import TODO_STALE_TTL, TODO_TTL
 from src.todos.models import Todo
 from src.ws import ws_manager
 
 router = APIRouter()
-
-# Redis client used for caching within the todos router
-redis = Redis.from_url(
-    os.getenv("REDIS_URL"), encoding="utf-8", decode_responses=True
-)
+logger = logging.getLogger(__name__)
 
 
 @router.get("/todos", response_model=list[TodoOut])
+@cache.cached(
+    "todos:list",
+    tags=["todos"],
+    ttl=3600,
+    stale_ttl=60,
+    local_ttl=5,
+    response_model=list[TodoOut],
+)
 async def list_todos(
-    db: Annotated[AsyncSession, Depends(get_async_db)]
+    db: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> list[Todo]:
     """Return all todos as a list of TodoOut models."""
     result = await db.execute(select(Todo).order_by(desc(Todo.created_at)))
@@ -32,30 +44,78 @@ async def list_todos(
     return todos
 
 
-@router.get("/todos/{todo_id}", response_model=TodoOut)
-async def get_expensive_todo(
-    todo_id: int, db: Annotated[AsyncSession, Depends(get_async_db)]
-) -> Todo:
-    cache_key = f"todo:{todo_id}"
-    cached_todo = await redis.get(cache_key)
-    if cached_todo:
-        data = json.loads(cached_todo)
-        return TodoOut.model_validate(data)
+# Registered before `/todos/{todo_id}`, which would otherwise match it
+@router.get("/todos/export")
+async def export_todos(
+    request: Request,
+    export_format: ExportFormatQuery = ExportFormat.NDJSON,
+    fetch_size: FetchSizeQuery = DEFAULT_FETCH_SIZE,
+) -> StreamingResponse:
+    """Stream all todos (newest first) with bounded memory."""
+    return export_response(
+        read_session(request),
+        select(Todo.__table__).order_by(desc(Todo.created_at)),
+        TodoOut,
+        export_format,
+        fetch_size,
+    )
 
-    result = await db.execute(select(Todo).where(Todo.id == todo_id))
-    todo = result.scalar_one_or_none()
-    if todo is None:
-        raise HTTPException(status_code=404, detail="Todo not found")
 
-    await asyncio.sleep(5)
+@router.get(
+    "/todos/{todo_id}",
+    response_model=TodoOut,
+    responses={
+        202: {
+            "model": JobOut,
+            "description": "Still being derived: poll the job at `Location` "
+            "or subscribe to its `job:{id}` WebSocket topic",
+        }
+    },
+)
+@cache.cached(
+    "todo:{todo_id}",
+    tags=["todo:{todo_id}"],
+    ttl=TODO_TTL,
+    stale_ttl=TODO_STALE_TTL,
+    local_ttl=5,
+    # requests share the job instead, each waiting for it as long as it asked
+    coalesce=False,
+    response_model=TodoOut,
+)
+async def get_expensive_todo(
+    todo_id: int,
+    # the result is read by the worker from the primary; a replica would
+    # only make the cache entry short-lived and trigger a second job
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    wait: float = Query(
+        10,
+        ge=0,
+        le=MAX_WAIT,
+        description="Seconds to wait for the result; after that (or right "
+        "away with 0) the response is 202 with the job deriving it",
+    ),
+) -> TodoOut:
+    """Return a todo once its expensive derivation is done.
 
-    todo_out = TodoOut.model_validate(todo)
-    await redis.setex(cache_key, 20, todo_out.model_dump_json())
+    The derivation runs as a `todo.derive` job in the background workers,
+    which store the result in this route's cache; concurrent requests share
+    a single job.
+    """
+    if await db.scalar(select(Todo.id).where(Todo.id == todo_id)) is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
 
-    return todo
+    job = await job_queue.submit("todo.derive", todo_id=todo_id)
+    job = await job_queue.wait(job.id, wait) or job
+    if job.status is JobStatus.FAILED:
+        raise HTTPException(
+            status_code=500, detail=f"Deriving the todo failed: {job.error}"
+        )
+    if job.status is not JobStatus.DONE:
+        raise JobPending(job)
+    return TodoOut.model_validate(job.result)
 
 
-@router.post("/todos")
+@router.post("/todos", response_model=TodoOut)
 async def create_todo(
     todo: TodoCreate, db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> Todo:
@@ -67,8 +127,13 @@ async def create_todo(
     )
     db.add(db_todo)
     await db.commit()
-    await db.refresh(db_todo)
 
-    todo_out = TodoOut.model_validate(db_todo)
-    await ws_manager.broadcast(todo_out.model_dump_json())
+    # The todo is committed either way; failing the request now would only
+    # make clients retry and create it twice.
+    try:
+        await ws_manager.publish_event(
+            "todos", "todo.created", TodoOut.model_validate(db_todo)
+        )
+    except Exception as exc:  # log the exception instead of silently passing
+        logger.exception("Failed to broadcast todo: %s", exc)
     return db_todo
@@ -7,3 +7,6 @@ class User(Base, BaseModel):
     __tablename__ = "users"
 
     username = Column(String(50), nullable=False, unique=True, index=True)
+
+    def cache_tags(self) -> tuple[str, ...]:
+        return ("users", f"user:{self.id}")
@@ -1,10 +1,20 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_async_db
+from src.cache import cache, mark_stale
+from src.database import get_async_db, get_read_db, read_session
+from src.export import (
+    DEFAULT_FETCH_SIZE,
+    ExportFormat,
+    ExportFormatQuery,
+    FetchSizeQuery,
+    export_response,
+)
 from src.users.dtos import UserCreate, UserOut
 from src.users.models import User
 
@@ -12,28 +22,54 @@ router = APIRouter()
 
 
 @router.get("/users", response_model=list[UserOut])
+@cache.cached(
+    "users:list",
+    tags=["users"],
+    ttl=3600,
+    stale_ttl=60,
+    local_ttl=5,
+    response_model=list[UserOut],
+)
 async def list_users(
-    db: Annotated[AsyncSession, Depends(get_async_db)]
+    db: Annotated[AsyncSession, Depends(get_read_db)]
 ) -> list[User]:
     result = await db.execute(select(User).order_by(User.created_at))
     users = result.scalars().all()
     return users
 
 
+@router.get("/users/export")
+async def export_users(
+    request: Request,
+    export_format: ExportFormatQuery = ExportFormat.NDJSON,
+    fetch_size: FetchSizeQuery = DEFAULT_FETCH_SIZE,
+) -> StreamingResponse:
+    """Stream all users with bounded memory."""
+    return export_response(
+        read_session(request),
+        select(User.__table__).order_by(User.created_at),
+        UserOut,
+        export_format,
+        fetch_size,
+    )
+
+
 @router.post("/users", response_model=UserOut)
 async def create_user(
     user: UserCreate, db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> User:
-    # Ensure username is unique
-    result = await db.execute(
-        select(User).where(User.username == user.username)
+    # Ensure username is unique: the insert is skipped (and returns no row)
+    # when it is taken, even by a concurrent request
+    db_user = await db.scalar(
+        insert(User)
+        .values(username=user.username)
+        .on_conflict_do_nothing(index_elements=["username"])
+        .returning(User)
     )
-    existing = result.scalar_one_or_none()
-    if existing:
+    if db_user is None:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    db_user = User(username=user.username)
-    db.add(db_user)
+    # plain INSERT statements are not seen by the flush-time tag tracking
+    mark_stale(db, *db_user.cache_tags())
     await db.commit()
-    await db.refresh(db_user)
     return db_user
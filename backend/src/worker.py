@@ -0,0 +1,26 @@
+"""Background job worker, run next to the API with `python -m src.worker`.
+
+Takes jobs off the Redis queue and runs up to `JOB_WORKER_CONCURRENCY` of
+them at once in a process pool (see `src.jobs`).
+"""
+
+import asyncio
+import logging
+
+import src.todos.jobs  # noqa: F401  (registers the todo job handlers)
+from src.cache import redis
+from src.database import close_db, init_db
+from src.jobs import WORKER_CONCURRENCY, Worker
+
+
+async def main() -> None:
+    await init_db()
+    try:
+        await Worker(redis, WORKER_CONCURRENCY).run()
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
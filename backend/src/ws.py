@@ -1,40 +1,292 @@
+import asyncio
+import json
+import os
+import re
+from collections.abc import Callable, Iterable
+from enum import StrEnum
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from src.broadcast import (
+    BroadcastBackend,
+    Frame,
+    InMemoryBroadcastBackend,
+    create_broadcast_backend,
+)
+from src.timing import track
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for WS_FRAME_FORMAT=msgpack
+    msgpack = None
+
+# Topics clients may subscribe to: all todos, a single conversation,
+# everything that concerns a single user, or a background job.
+TOPIC_PATTERN = re.compile(
+    r"^(todos|conversation:\d+|user:\d+|job:[0-9a-f]{32})$"
+)
+
+
+class OverflowPolicy(StrEnum):
+    """What to do when a client's outbound queue is full."""
+
+    # Discard the oldest queued frame to make room for the new one
+    DROP_OLDEST = "drop_oldest"
+    # Close the connection of a client that cannot keep up
+    DISCONNECT = "disconnect"
+
+
+class FrameFormat(StrEnum):
+    """How events are framed on the wire."""
+
+    # JSON in text frames; compresses well with permessage-deflate
+    TEXT = "text"
+    # The same UTF-8 JSON bytes in binary frames (no per-socket encoding)
+    BINARY = "binary"
+    # MessagePack in binary frames (requires the `msgpack` extra)
+    MSGPACK = "msgpack"
+
+
+def encode_event(
+    event_type: str, payload: BaseModel, frame_format: FrameFormat
+) -> Frame:
+    """Serialize `{"type": ..., "data": ...}` exactly once.
+
+    The returned frame is shared by every recipient, in this worker and,
+    through the broadcast backend, in every other one.
+    """
+    if frame_format is FrameFormat.MSGPACK:
+        data = payload.model_dump(mode="json")
+        return msgpack.packb({"type": event_type, "data": data})
+    body = to_json({"type": event_type, "data": payload})
+    if frame_format is FrameFormat.BINARY:
+        return body
+    return body.decode()
+
+
+class WebSocketConnection:
+    """A connected client with its own bounded outbound queue.
+
+    Frames are written by a dedicated writer task, so publishing never waits
+    on a slow client and one slow client never delays the others.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue_size: int) -> None:
+        self.websocket = websocket
+        self.queue: asyncio.Queue[Frame] = asyncio.Queue(
+            maxsize=max_queue_size
+        )
+        self.topics: set[str] = set()
+        self.dropped_frames = 0
+        self.writer: asyncio.Task | None = None
+
+    def start(self, on_error: Callable[[WebSocket], None]) -> None:
+        self.writer = asyncio.create_task(self._write_loop(on_error))
+
+    def stop(self) -> None:
+        # the writer may be stopping itself after a failed send
+        writer = self.writer
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def _write_loop(self, on_error: Callable[[WebSocket], None]) -> None:
+        try:
+            while True:
+                frame = await self.queue.get()
+                if isinstance(frame, str):
+                    await self.websocket.send_text(frame)
+                else:
+                    await self.websocket.send_bytes(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # remove dead/errored connection
+            on_error(self.websocket)
 
 
 class WebSocketConnectionManager:
     """
-    Manages WebSocket connections and broadcasting
-    messages to all connected clients.
+    Manages WebSocket connections and publishing messages
+    to the clients subscribed to a topic.
     """
 
-    def __init__(self) -> None:
-        self.active_connections: list[WebSocket] = []
+    def __init__(
+        self,
+        backend: BroadcastBackend | None = None,
+        max_queue_size: int = 100,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        frame_format: FrameFormat = FrameFormat.TEXT,
+        max_topics: int = 100,
+    ) -> None:
+        if frame_format is FrameFormat.MSGPACK and msgpack is None:
+            raise RuntimeError("WS_FRAME_FORMAT=msgpack requires msgpack")
+        self.backend = backend or InMemoryBroadcastBackend()
+        self.frame_format = frame_format
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        # topics a single connection may subscribe to at once
+        self.max_topics = max_topics
+        self.active_connections: dict[WebSocket, WebSocketConnection] = {}
+        # topic -> connections subscribed to it
+        self.topics: dict[str, set[WebSocketConnection]] = {}
+        # counters kept across connections for the metrics endpoint
+        self.dropped_frames = 0
+        self.slow_consumers_disconnected = 0
+        self._closing: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
 
     async def connect(self, websocket: WebSocket) -> None:
         # Accept the websocket handshake explicitly when the endpoint runs.
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = WebSocketConnection(websocket, self.max_queue_size)
+        self.active_connections[websocket] = connection
+        connection.start(on_error=self.disconnect)
 
     def disconnect(self, websocket: WebSocket) -> None:
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.stop()
+        for topic in connection.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.topics[topic]
+
+    def subscribe(self, websocket: WebSocket, topic: str) -> bool:
+        """Subscribe `websocket` to `topic`.
+
+        Returns False, subscribing nothing, when the connection already has
+        `max_topics` other topics.
+        """
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return True
+        if (
+            topic not in connection.topics
+            and len(connection.topics) >= self.max_topics
+        ):
+            return False
+        self.topics.setdefault(topic, set()).add(connection)
+        connection.topics.add(topic)
+        return True
+
+    def unsubscribe(self, websocket: WebSocket, topic: str) -> None:
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.topics[topic]
+        connection.topics.discard(topic)
+
+    async def publish_event(
+        self,
+        topics: str | Iterable[str],
+        event_type: str,
+        payload: BaseModel,
+    ) -> None:
+        """Publish `payload` wrapped in a typed event envelope."""
+        frame = encode_event(event_type, payload, self.frame_format)
+        await self.publish(topics, frame)
+
+    async def publish(self, topics: str | Iterable[str], frame: Frame) -> None:
+        """Publish an encoded frame to `topics` through the backend.
+
+        Every worker then queues it once for each of its connections
+        subscribed to any of the topics; this never waits on the clients.
+        """
+        if isinstance(topics, str):
+            topics = (topics,)
+        with track("broadcast"):
+            await self.backend.publish(tuple(topics), frame)
+
+    def deliver_event(
+        self,
+        topics: str | Iterable[str],
+        event_type: str,
+        payload: BaseModel,
+    ) -> None:
+        """Send an event to this worker's clients only.
+
+        For events every worker learns about by itself, which would reach
+        each client once per worker if they were published.
+        """
+        if isinstance(topics, str):
+            topics = (topics,)
+        frame = encode_event(event_type, payload, self.frame_format)
+        self._deliver(topics, frame)
 
-    async def broadcast(self, message: str) -> None:
-        # iterate over a copy to avoid mutation while sending
-        for connection in list(self.active_connections):
+    def _deliver(self, topics: Iterable[str], frame: Frame) -> None:
+        recipients: set[WebSocketConnection] = set()
+        for topic in topics:
+            recipients.update(self.topics.get(topic, ()))
+        self._enqueue(recipients, frame)
+
+    def _enqueue(
+        self, connections: Iterable[WebSocketConnection], frame: Frame
+    ) -> None:
+        for connection in connections:
             try:
-                await connection.send_text(message)
-            except Exception:
-                # remove dead/errored connection
-                try:
-                    self.active_connections.remove(connection)
-                except ValueError:
-                    pass
+                connection.queue.put_nowait(frame)
+                continue
+            except asyncio.QueueFull:
+                pass
+
+            if self.overflow_policy is OverflowPolicy.DISCONNECT:
+                self._close_slow_consumer(connection)
+                continue
+            connection.queue.get_nowait()
+            connection.queue.put_nowait(frame)
+            connection.dropped_frames += 1
+            self.dropped_frames += 1
+
+    def _close_slow_consumer(self, connection: WebSocketConnection) -> None:
+        self.slow_consumers_disconnected += 1
+        self.dropped_frames += connection.queue.qsize() + 1
+        self.disconnect(connection.websocket)
+        # 1013 "Try Again Later": the client may reconnect and resync
+        task = asyncio.create_task(connection.websocket.close(code=1013))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def metrics(self) -> dict[str, int]:
+        depths = [c.queue.qsize() for c in self.active_connections.values()]
+        return {
+            "connections": len(self.active_connections),
+            "topics": len(self.topics),
+            "max_queue_size": self.max_queue_size,
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_frames": self.dropped_frames,
+            "slow_consumers_disconnected": self.slow_consumers_disconnected,
+        }
 
 
 # Shared instance that other modules can import
-ws_manager = WebSocketConnectionManager()
+ws_manager = WebSocketConnectionManager(
+    backend=create_broadcast_backend(),
+    max_queue_size=int(os.getenv("WS_SEND_QUEUE_SIZE", "100")),
+    overflow_policy=OverflowPolicy(
+        os.getenv("WS_OVERFLOW_POLICY", OverflowPolicy.DROP_OLDEST)
+    ),
+    frame_format=FrameFormat(os.getenv("WS_FRAME_FORMAT", FrameFormat.TEXT)),
+    max_topics=int(os.getenv("WS_MAX_TOPICS", "100")),
+)
+
+# Sent when a subscription would exceed `max_topics`
+TOO_MANY_TOPICS = json.dumps({"error": "Too many topics"})
 
 # Router for websocket endpoints (keeps websocket code out of main.py)
 router = APIRouter()
@@ -44,6 +296,13 @@ router = APIRouter()
 async def websocket_endpoint(websocket: WebSocket) -> None:
     """WebSocket endpoint that registers clients with the shared manager.
 
+    Clients choose what they receive by subscribing to topics
+    (`todos`, `conversation:{id}`, `user:{id}` or `job:{id}`), either up
+    front with a comma-separated `?topics=` query param or at any time by
+    sending `{"action": "subscribe" | "unsubscribe", "topic": "..."}`.
+    Subscriptions beyond `WS_MAX_TOPICS` per connection are refused with an
+    error frame.
+
     Note: During the WebSocket handshake the browser will send an Origin header.
     FastAPI/Starlette will reject the connection with 403 if that origin is not
     allowed by the app's CORSMiddleware. Ensure your frontend origin
@@ -52,9 +311,41 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     """
     await ws_manager.connect(websocket)
     try:
-        # Keep the connection open. We don't expect messages from the client;
-        # awaiting receive_text() simply allows detecting disconnects.
+        for topic in websocket.query_params.get("topics", "").split(","):
+            if TOPIC_PATTERN.match(topic) and not ws_manager.subscribe(
+                websocket, topic
+            ):
+                await websocket.send_text(TOO_MANY_TOPICS)
+                break
         while True:
-            await websocket.receive_text()
+            try:
+                command = json.loads(await websocket.receive_text())
+                action = command["action"]
+                topic = command["topic"]
+            except (ValueError, TypeError, KeyError):
+                await websocket.send_text(
+                    json.dumps({"error": "Invalid subscription command"})
+                )
+                continue
+
+            if not isinstance(topic, str) or not TOPIC_PATTERN.match(topic):
+                await websocket.send_text(
+                    json.dumps({"error": "Unknown topic"})
+                )
+            elif action == "subscribe":
+                if not ws_manager.subscribe(websocket, topic):
+                    await websocket.send_text(TOO_MANY_TOPICS)
+            elif action == "unsubscribe":
+                ws_manager.unsubscribe(websocket, topic)
+            else:
+                await websocket.send_text(
+                    json.dumps({"error": "Unknown action"})
+                )
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
+
+
+@router.get("/ws/metrics")
+def websocket_metrics() -> dict[str, int]:
+    """Queue depth and dropped-frame counters for sizing send queues."""
+    return ws_manager.metrics()
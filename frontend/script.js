@@ -71,6 +71,7 @@ const fetchConversation = async () => {
         }
         const conv = await res.json();
         conversationId = conv.id;
+        subscribe(`conversation:${conversationId}`);
 
         const messages = Array.isArray(conv.messages) ? conv.messages : [];
         // API returns newest->oldest; show oldest->newest
@@ -91,27 +92,44 @@ const fetchConversation = async () => {
 
 // Setup WebSocket and handle incoming messages
 const socket = new WebSocket(WS_URL);
+// Events arrive as JSON in text frames, or as UTF-8 JSON in binary frames
+// when the backend runs with WS_FRAME_FORMAT=binary.
+socket.binaryType = 'arraybuffer';
+const decoder = new TextDecoder();
+const pendingTopics = [];
+
+// The server only pushes events for topics we subscribe to
+// (e.g. `conversation:1`); queue subscriptions until the socket is open.
+const subscribe = (topic) => {
+    if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ action: 'subscribe', topic }));
+    } else {
+        pendingTopics.push(topic);
+    }
+};
 
 socket.addEventListener('open', () => {
     console.log('WebSocket connected');
+    pendingTopics.splice(0).forEach(subscribe);
 });
 
 socket.addEventListener('message', (evt) => {
     try {
-        const payload = JSON.parse(evt.data);
-        // We expect message objects to have a conversation_id property.
-        if (!payload || typeof payload !== 'object') return;
-        if (!('conversation_id' in payload)) return; // ignore other broadcasts (e.g., todos)
-        // If conversationId not yet loaded, try to fetch it (to sync state)
-        if (conversationId === null) {
-            // fetch conversation once to initialize
-            fetchConversation();
-            return;
-        }
-        if (Number(payload.conversation_id) === Number(conversationId)) {
+        const raw = typeof evt.data === 'string' ? evt.data : decoder.decode(evt.data);
+        // Events are envelopes: { type: 'message.created', data: {...} }
+        const event = JSON.parse(raw);
+        if (!event) return;
+        const payload = event.data;
+        if (!payload || Number(payload.conversation_id) !== Number(conversationId)) return;
+        if (event.type === 'message.created') {
             appendMessage(payload);
             scrollToBottom();
+        } else if (event.type === 'messages.created') {
+            // bulk imports send one summary event; reload the latest page
+            seenMessageIds.clear();
+            fetchConversation();
         }
+        // ignore other events (e.g., errors)
     } catch (e) {
         console.error('Error handling websocket message', e);
     }